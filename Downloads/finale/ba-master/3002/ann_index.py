@@ -0,0 +1,148 @@
+# ann_index.py
+
+import logging
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+# Random-projection LSH: each table hashes a vector to the sign pattern of HASH_BITS projections;
+# more tables raise recall, more bits shrink the buckets
+HASH_TABLES = 16
+HASH_BITS = 10
+ANN_INDEX_DIR = os.environ.get('ANN_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ann_index'))
+KEEP_VERSIONS = 2  # The live index and the one before it, for readers that still have it mapped
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+class AnnIndex:
+    """
+    Cosine nearest-neighbour index over item vectors, memory-mapped from .npy files.
+
+    `movie_ids` is sorted, `vectors` holds the L2-normalized vectors in the same order, and for
+    every table `sorted_codes[t]`/`order[t]` list the items by bucket so a bucket is one
+    searchsorted away. Candidates from the query's buckets are re-ranked by exact cosine.
+    """
+
+    FILES = ('movie_ids', 'vectors', 'planes', 'sorted_codes', 'order')
+
+    def __init__(self, movie_ids, vectors, planes, sorted_codes, order):
+        self.movie_ids = movie_ids
+        self.vectors = vectors
+        self.planes = planes
+        self.sorted_codes = sorted_codes
+        self.order = order
+
+    @classmethod
+    def build(cls, movie_ids, vectors, tables=HASH_TABLES, bits=HASH_BITS, seed=0):
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        sort = np.argsort(movie_ids, kind='stable')
+        movie_ids = movie_ids[sort]
+        vectors = np.asarray(vectors, dtype=np.float32)[sort]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        planes = np.random.default_rng(seed).normal(size=(tables, bits, vectors.shape[1])).astype(np.float32)
+        codes = cls._hash(planes, vectors)  # (tables, items)
+        order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+        sorted_codes = np.take_along_axis(codes, order, axis=1)
+        return cls(movie_ids, vectors, planes, sorted_codes, order)
+
+    @staticmethod
+    def _hash(planes, vectors):
+        """Sign bits of every projection packed into one integer code per table."""
+        bits = np.einsum('tbd,nd->tnb', planes, vectors) > 0
+        weights = (1 << np.arange(planes.shape[1], dtype=np.uint32))
+        return (bits * weights).sum(axis=2).astype(np.uint32)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-maps the arrays; pages are shared between workers through the OS page cache."""
+        return cls(*(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in cls.FILES))
+
+    def similar(self, movie_id, k=20):
+        """Returns up to `k` (movie_id, cosine) pairs most similar to `movie_id`, or None if it isn't indexed."""
+        i = int(np.searchsorted(self.movie_ids, movie_id))
+        if i >= len(self.movie_ids) or self.movie_ids[i] != movie_id:
+            return None
+
+        query = np.asarray(self.vectors[i])
+        codes = self._hash(self.planes, query[None, :])[:, 0]
+        buckets = []
+        for table, code in enumerate(codes):
+            lo, hi = np.searchsorted(self.sorted_codes[table], [code, code + 1])
+            buckets.append(self.order[table][lo:hi])
+        # Deduplicate through a mask: cheaper than np.unique on a few thousand candidates
+        seen = np.zeros(len(self.movie_ids), dtype=bool)
+        seen[np.concatenate(buckets)] = True
+        seen[i] = False
+        candidates = np.flatnonzero(seen)
+        if not len(candidates):
+            return []
+
+        scores = np.asarray(self.vectors[candidates]) @ query
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        ranked = np.argsort(-scores, kind='stable')
+        return [(int(self.movie_ids[candidates[j]]), float(scores[j])) for j in ranked]
+
+
+def save_index(index, root=ANN_INDEX_DIR):
+    """Writes a new version directory, then atomically points CURRENT at it."""
+    version = str(time.time_ns())
+    index.save(os.path.join(root, version))
+    pointer = os.path.join(root, 'CURRENT')
+    with open(f'{pointer}.tmp', 'w') as f:
+        f.write(version)
+    os.replace(f'{pointer}.tmp', pointer)
+
+    versions = sorted(name for name in os.listdir(root) if name.isdigit())
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+def build_index_from_model(model, root=ANN_INDEX_DIR):
+    """Indexes the movie factors of a trained mf_model.FactorModel."""
+    started = time.time()
+    index = AnnIndex.build(model.movie_ids, model.item_factors)
+    save_index(index, root)
+    logging.info(f"Built ANN index over {len(index.movie_ids)} movies in {time.time() - started:.1f}s")
+    return index
+
+
+def get_index(root=ANN_INDEX_DIR):
+    """Returns the live index, remapping it when a new version is published; None if none was built."""
+    global _index, _index_version
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or version != _index_version:
+            try:
+                _index, _index_version = AnnIndex.load(os.path.join(root, version)), version
+            except OSError as e:
+                logging.warning(f"Could not load ANN index {version}: {e}")
+                return _index
+        return _index
+
+
+def similar_movie_ids(movie_id, k=20):
+    """Movie IDs most similar to `movie_id`, or None when the movie isn't indexed (callers fall back to TMDB)."""
+    index = get_index()
+    if index is None:
+        return None
+    neighbours = index.similar(movie_id, k)
+    return None if neighbours is None else [neighbour for neighbour, score in neighbours]
@@ -23,7 +23,7 @@ def login():
         if user and user.check_password(password):
             login_user(user)
             flash("Logged in successfully.", "auth-success")
-            return redirect(url_for('index'))  # Redirect to homepage
+            return redirect(url_for('main.index'))  # Redirect to homepage
         else:
             flash("Invalid username or password.", "auth-danger")
             return render_template('login.html')  # Reload login page with error
@@ -35,7 +35,7 @@ def login():
 def logout():
     logout_user()
     flash("You have been logged out.", "auth-info")
-    return redirect(url_for('index'))  # Redirect to homepage
+    return redirect(url_for('main.index'))  # Redirect to homepage
 
 @auth_blueprint.route('/register', methods=['GET', 'POST'])
 def register():
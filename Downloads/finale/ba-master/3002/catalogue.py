@@ -0,0 +1,86 @@
+# catalogue.py
+
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models import db, Movie
+
+# Catalogue rows older than this are re-fetched from TMDB (and still served if TMDB is down)
+CATALOGUE_MAX_AGE = timedelta(days=int(os.environ.get('CATALOGUE_MAX_AGE_DAYS', 7)))
+
+
+def parse_release_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_fresh(movie):
+    return movie.has_details and datetime.utcnow() - movie.updated_at < CATALOGUE_MAX_AGE
+
+
+def get_catalogued(movie_ids):
+    """Returns {movie_id: Movie} for catalogued movies with full details (fresh or stale)."""
+    if not movie_ids:
+        return {}
+    try:
+        movies = Movie.query.filter(Movie.id.in_(movie_ids), Movie.has_details.is_(True)).all()
+    except SQLAlchemyError as e:
+        logging.warning(f"Catalogue read failed: {e}")
+        return {}
+    return {movie.id: movie for movie in movies}
+
+
+def _apply(movie, data, has_details):
+    rating = data.get('rating')
+    movie.title = data.get('title') or 'No Title'
+    movie.release_date = parse_release_date(data.get('release_date'))
+    movie.language = data.get('original_language')
+    movie.rating = rating if isinstance(rating, (int, float)) else None
+    movie.genre_ids = data.get('genre_ids', [])
+    movie.poster = data.get('poster')
+    movie.backdrop = data.get('backdrop')
+    if has_details:
+        movie.overview = data.get('overview')
+        movie.genres = data.get('genres', [])
+        movie.director = data.get('director')
+        movie.main_characters = data.get('main_characters')
+        movie.has_details = True
+    movie.updated_at = datetime.utcnow()
+
+
+def _save(entries, has_details):
+    """Upserts movies in a session of their own so the caller's transaction is never committed early."""
+    entries = [entry for entry in entries if entry and entry.get('id')]
+    if not entries:
+        return
+    try:
+        with Session(db.engine) as session:
+            existing = {
+                movie.id: movie
+                for movie in session.query(Movie).filter(Movie.id.in_([entry['id'] for entry in entries]))
+            }
+            for entry in entries:
+                movie = existing.get(entry['id'])
+                if movie is None:
+                    movie = existing[entry['id']] = Movie(id=entry['id'])
+                    session.add(movie)
+                elif movie.has_details and not has_details:
+                    continue  # A list entry never downgrades a full row
+                _apply(movie, entry, has_details)
+            session.commit()
+    except SQLAlchemyError as e:
+        logging.warning(f"Catalogue write failed: {e}")
+
+
+def save_details(movies):
+    """Writes full movie details (utils.compact_movie_details output) through to the catalogue."""
+    _save(movies, has_details=True)
+
+
+def save_list_entries(movies):
+    """Writes movies seen in TMDB lists through to the catalogue without touching fully catalogued rows."""
+    _save(movies, has_details=False)
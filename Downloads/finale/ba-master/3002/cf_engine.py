@@ -0,0 +1,384 @@
+# cf_engine.py
+
+import os
+import threading
+import numpy as np
+from flask import current_app
+from scipy.sparse import csr_matrix
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+from models import db, dialect_insert, Review, ReviewChange, ReviewVersion
+
+# Similarities at or below this are treated as "no signal" (constant or near-constant rating vectors)
+MIN_VARIANCE = 1e-9
+
+# Review changes kept in the shared log for catching engines up; an engine further behind reloads every review
+CF_CHANGE_LOG_SIZE = int(os.environ.get('CF_CHANGE_LOG_SIZE', 1000))
+# Older log entries are pruned every this many changes
+CF_LOG_PRUNE_EVERY = 100
+
+# Session.info flag: the session has review changes it hasn't committed yet
+_DIRTY = 'cf_engine_dirty'
+
+
+class RatingMatrix:
+    """
+    Sparse user x movie rating matrix with vectorized user-user similarity and neighbour scoring.
+
+    Pearson similarity is computed over the movies both users rated (matching the original
+    pairwise np.corrcoef), using six sparse products against the target user's row instead
+    of two queries per pair.
+    """
+
+    def __init__(self, user_ids, movie_ids, ratings, version=0):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        self.version = version
+
+        self.user_ids, rows = np.unique(user_ids, return_inverse=True)
+        self.movie_ids, cols = np.unique(movie_ids, return_inverse=True)
+        self.user_index = {int(user_id): i for i, user_id in enumerate(self.user_ids)}
+        n_users, n_items = len(self.user_ids), len(self.movie_ids)
+
+        # Keep only the last review per (user, movie); input is in insertion order
+        keys = rows.astype(np.int64) * max(n_items, 1) + cols
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        order = np.lexsort((cols[keep], rows[keep]))
+        rows, cols, ratings = rows[keep][order], cols[keep][order], ratings[keep][order]
+
+        self._set_entries(np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_users)))), cols, ratings)
+
+    def _set_entries(self, indptr, cols, ratings, norms=None):
+        """Builds the matrices from CSR arrays (column indices sorted within each row); `norms` if already known."""
+        # R (ratings), B (rated mask) and R2 (squared ratings) share one sparsity pattern,
+        # so a rating of 0 still counts as "rated"
+        shape = (len(self.user_ids), len(self.movie_ids))
+        self.R = csr_matrix((ratings, cols, indptr), shape=shape)
+        self.B = csr_matrix((np.ones_like(ratings), cols, indptr), shape=shape)
+        self.R2 = csr_matrix((ratings ** 2, cols, indptr), shape=shape)
+        self.norms = norms if norms is not None else np.sqrt(np.asarray(self.R2.sum(axis=1)).ravel())
+
+    @classmethod
+    def from_reviews(cls, version=0):
+        """Loads every review in one query."""
+        rows = db.session.query(Review.user_id, Review.movie_id, Review.rating).order_by(Review.id).all()
+        if not rows:
+            return cls([], [], [], version=version)
+        user_ids, movie_ids, ratings = zip(*rows)
+        return cls(user_ids, movie_ids, ratings, version=version)
+
+    def triplets(self):
+        """Returns the (user_ids, movie_ids, ratings) arrays held by the matrix, one entry per review."""
+        rows = np.repeat(np.arange(len(self.user_ids)), np.diff(self.R.indptr))
+        return self.user_ids[rows], self.movie_ids[self.R.indices], self.R.data
+
+    def apply_changes(self, changes, version=0):
+        """
+        Applies review changes without reloading the reviews table and returns the up-to-date matrix.
+        `changes` are (user_id, movie_id, rating) in commit order, with rating None for a deleted review.
+
+        New ratings of movies the user had already rated are written into the existing entries in
+        place, together with that user's norm. Added or removed entries produce a new matrix, made
+        by splicing them into copies of the sparse arrays, never by re-sorting every rating. Users and
+        movies left with no ratings keep an empty row or column.
+        """
+        latest = {(int(user_id), int(movie_id)): rating for user_id, movie_id, rating in changes}
+        positions = {key: self._position(*key) for key in latest}
+        # Removing a rating that isn't there changes nothing
+        latest = {key: rating for key, rating in latest.items() if rating is not None or positions[key] is not None}
+        if all(positions[key] is not None and rating is not None for key, rating in latest.items()):
+            for key, rating in latest.items():
+                self.R.data[positions[key]] = rating
+                self.R2.data[positions[key]] = rating ** 2
+            self._update_norms({self.user_index[user_id] for user_id, _ in latest})
+            self.version = version
+            return self
+        return self._spliced(latest, version)
+
+    def _update_norms(self, rows):
+        for i in rows:
+            self.norms[i] = np.sqrt(self.R2.data[self.R.indptr[i]:self.R.indptr[i + 1]].sum())
+
+    def _position(self, user_id, movie_id):
+        """Index of the (user, movie) entry in the CSR data arrays, or None if the user hasn't rated the movie."""
+        i = self.user_index.get(user_id)
+        j = np.searchsorted(self.movie_ids, movie_id)
+        if i is None or j == len(self.movie_ids) or self.movie_ids[j] != movie_id:
+            return None
+        start, end = self.R.indptr[i], self.R.indptr[i + 1]
+        k = start + np.searchsorted(self.R.indices[start:end], j)
+        return int(k) if k < end and self.R.indices[k] == j else None
+
+    def _spliced(self, latest, version):
+        """Returns a new matrix with the latest rating (None: removed) of each (user, movie) applied."""
+        users, movies = (np.array(ids, dtype=np.int64) for ids in zip(*latest))
+        ratings = np.array([np.nan if rating is None else rating for rating in latest.values()])
+
+        matrix = RatingMatrix.__new__(RatingMatrix)
+        matrix.version = version
+        matrix.user_ids = _with_ids(self.user_ids, users)
+        matrix.movie_ids = _with_ids(self.movie_ids, movies)
+        if len(matrix.user_ids) == len(self.user_ids):
+            matrix.user_index = self.user_index
+        else:
+            matrix.user_index = {int(user_id): i for i, user_id in enumerate(matrix.user_ids)}
+
+        # Existing entries in the new coordinates: new users get empty rows, new movies shift column indices
+        n_users = len(matrix.user_ids)
+        old_rows = np.searchsorted(matrix.user_ids, self.user_ids)
+        counts = np.zeros(n_users, dtype=np.int64)
+        counts[old_rows] = np.diff(self.R.indptr)
+        norms = np.zeros(n_users)
+        norms[old_rows] = self.norms
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        cols = self.R.indices
+        if len(matrix.movie_ids) != len(self.movie_ids):
+            cols = np.searchsorted(matrix.movie_ids, self.movie_ids).astype(cols.dtype)[cols]
+
+        # Locate each change within its user's row
+        rows, change_cols = np.searchsorted(matrix.user_ids, users), np.searchsorted(matrix.movie_ids, movies)
+        at = np.array([
+            indptr[i] + np.searchsorted(cols[indptr[i]:indptr[i + 1]], j) for i, j in zip(rows, change_cols)
+        ], dtype=np.int64)
+        found = at < indptr[rows + 1]
+        found[found] = cols[at[found]] == change_cols[found]
+        rated = ~np.isnan(ratings)
+        updated, removed, added = found & rated, found & ~rated, ~found & rated
+
+        # Drop removed entries, then insert added ones in (position, row, column) order; empty rows share a position.
+        # Each step copies the arrays once, and there is always at least one.
+        data = self.R.data
+        removed_at = np.sort(at[removed])
+        if len(removed_at):
+            keep = np.ones(len(data), dtype=bool)
+            keep[removed_at] = False
+            data, cols = data[keep], cols[keep]
+        order = np.lexsort((change_cols[added], rows[added], at[added]))
+        insert_at = at[added][order]
+        insert_at -= np.searchsorted(removed_at, insert_at)
+        if len(insert_at):
+            data = np.insert(data, insert_at, ratings[added][order])
+            cols = np.insert(cols, insert_at, change_cols[added][order])
+        update_at = at[updated] - np.searchsorted(removed_at, at[updated])
+        data[update_at + np.searchsorted(insert_at, update_at, side='right')] = ratings[updated]
+
+        counts += np.bincount(rows[added], minlength=n_users) - np.bincount(rows[removed], minlength=n_users)
+        matrix._set_entries(np.concatenate(([0], np.cumsum(counts))), cols, data, norms)
+        matrix._update_norms(set(rows.tolist()))
+        return matrix
+
+    def _row(self, user_id):
+        i = self.user_index.get(user_id)
+        if i is None:
+            return None, None, None
+        return i, self.R[i].toarray().ravel(), self.B[i].toarray().ravel()
+
+    def similarities(self, user_id, method='pearson'):
+        """Returns the similarity of `user_id` to every user (aligned with self.user_ids); 0 for itself."""
+        i, r, b = self._row(user_id)
+        sims = np.zeros(len(self.user_ids))
+        if i is None:
+            return sims
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if method == 'cosine':
+                sims = (self.R @ r) / (self.norms * self.norms[i])
+            else:
+                n, sx, sxx = (self.B @ np.column_stack((b, r, r ** 2))).T
+                sy, sxy = (self.R @ np.column_stack((b, r))).T
+                syy = self.R2 @ b
+                var_x = n * sxx - sx ** 2
+                var_y = n * syy - sy ** 2
+                valid = (n >= 2) & (var_x > MIN_VARIANCE) & (var_y > MIN_VARIANCE)
+                sims = np.where(valid, (n * sxy - sx * sy) / np.sqrt(np.where(valid, var_x * var_y, 1)), 0)
+
+        sims = np.nan_to_num(sims, nan=0.0, posinf=0.0, neginf=0.0)
+        sims[i] = 0
+        return sims
+
+    def similarity(self, user_id, other_user_ids, method='pearson'):
+        """Returns {other_user_id: similarity} for the given users."""
+        sims = self.similarities(user_id, method)
+        return {
+            other: float(sims[self.user_index[other]]) if other in self.user_index else 0.0
+            for other in other_user_ids
+        }
+
+    def top_neighbours(self, user_id, k=20, method='pearson'):
+        """Returns up to `k` (user_id, similarity) pairs with positive similarity, most similar first."""
+        sims = self.similarities(user_id, method)
+        if not len(sims):
+            return []
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        return [(int(self.user_ids[j]), float(sims[j])) for j in top if sims[j] > 0]
+
+    def score_items(self, user_id, neighbours, min_rating=None):
+        """
+        Scores movies `user_id` hasn't rated by the similarity-weighted average of the neighbours' ratings.
+
+        `neighbours` maps user IDs to weights. Only movies some neighbour rated (at least `min_rating`,
+        if given) are returned, as (movie_id, score) pairs with the best first.
+        """
+        neighbours = {user: weight for user, weight in neighbours.items() if user in self.user_index}
+        if not neighbours:
+            return []
+        idx = [self.user_index[user] for user in neighbours]
+        weights = np.array(list(neighbours.values()), dtype=np.float64)
+        Rn, Bn = self.R[idx], self.B[idx]
+
+        eligible = Rn.copy()
+        eligible.data = (Rn.data >= min_rating).astype(np.float64) if min_rating is not None else np.ones_like(Rn.data)
+        eligible = np.asarray(eligible.sum(axis=0)).ravel() > 0
+
+        i = self.user_index.get(user_id)
+        if i is not None:
+            eligible[self.B[i].indices] = False
+
+        numerator = weights @ Rn
+        denominator = np.abs(weights) @ Bn
+        scores = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+        candidates = np.flatnonzero(eligible)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(self.movie_ids[j]), float(scores[j])) for j in candidates]
+
+
+class EngineCache:
+    """
+    The rating matrix for one app. Every review change bumps a version shared by all processes through
+    the database and is logged under it, so a worker whose matrix is behind (whoever made the change)
+    catches up by replaying the logged changes, and only reloads every review when it has no matrix yet
+    or the log no longer reaches back to its version.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self._build_lock = threading.Lock()  # One build at a time; other requests wait and reuse it
+
+    def get(self, session):
+        engine = self.engine
+        if engine is not None and session.info.get(_DIRTY):
+            return engine  # The session's own uncommitted changes stay out of the shared matrix
+        version = current_version(session)
+        if engine is not None and engine.version == version:
+            return engine
+        with self._build_lock:
+            engine = self.engine
+            if engine is None or engine.version != version:
+                changes = _changes_since(session, engine.version, version) if engine is not None else None
+                if changes is None:
+                    engine = RatingMatrix.from_reviews(version=version)
+                else:
+                    engine = engine.apply_changes(changes, version=version)
+                self.engine = engine
+        return engine
+
+
+def _with_ids(ids, new_ids):
+    """Returns the sorted `ids` with those of `new_ids` they lack inserted in order."""
+    at = np.searchsorted(ids, new_ids)
+    present = at < len(ids)
+    present[present] = ids[at[present]] == new_ids[present]
+    missing = np.unique(new_ids[~present])
+    return np.insert(ids, np.searchsorted(ids, missing), missing)
+
+
+def _engine_cache():
+    return current_app.extensions.setdefault('cf_engine', EngineCache())
+
+
+def current_version(session):
+    """Returns the review version committed to the database (0 before the first logged change)."""
+    table = ReviewVersion.__table__
+    return session.execute(select(table.c.version).where(table.c.id == 1)).scalar() or 0
+
+
+def _changes_since(session, since, version):
+    """Returns the changes logged after `since` up to `version`, or None if they can't all be replayed."""
+    table = ReviewChange.__table__
+    rows = session.execute(
+        select(table.c.user_id, table.c.movie_id, table.c.rating)
+        .where(table.c.version > since, table.c.version <= version)
+        .order_by(table.c.version)
+    ).all()
+    if len(rows) != version - since or any(user_id is None for user_id, _, _ in rows):
+        return None
+    return [tuple(row) for row in rows]
+
+
+def _next_version(connection):
+    """Bumps the shared version; the row stays locked until the transaction ends, which orders the writers."""
+    table = ReviewVersion.__table__
+    bump = update(table).where(table.c.id == 1).values(version=table.c.version + 1).returning(table.c.version)
+    version = connection.execute(bump).scalar()
+    if version is None:  # First change logged on this database
+        connection.execute(
+            dialect_insert(ReviewVersion, connection).values(id=1, version=0).on_conflict_do_nothing(index_elements=['id'])
+        )
+        version = connection.execute(bump).scalar()
+    return version
+
+
+def record_change(session, user_id, movie_id, rating):
+    """
+    Logs a review change (rating None for a deletion) in the session's transaction, so every worker's
+    engine applies it once it commits. Review mapper events call this; writes that bypass the ORM
+    (Core upserts) call it themselves.
+    """
+    connection = session.connection()
+    version = _next_version(connection)
+    table = ReviewChange.__table__
+    connection.execute(insert(table).values(version=version, user_id=user_id, movie_id=movie_id, rating=rating))
+    if version % CF_LOG_PRUNE_EVERY == 0:
+        connection.execute(delete(table).where(table.c.version <= version - CF_CHANGE_LOG_SIZE))
+    session.info[_DIRTY] = True
+
+
+def invalidate(session=None):
+    """
+    Makes every engine reload all reviews, e.g. after bulk query.update()/delete() on reviews.
+    Call it in the transaction that made the change (default: db.session's).
+    """
+    record_change(session if session is not None else db.session, None, None, None)
+
+
+# The mapper events run at flush time; the engines only see the changes once the transaction commits
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    record_change(object_session(review), review.user_id, review.movie_id, review.rating)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    state = inspect(review)
+    user_id, movie_id = state.attrs.user_id.history, state.attrs.movie_id.history
+    if user_id.deleted or movie_id.deleted:
+        old_user_id = user_id.deleted[0] if user_id.deleted else review.user_id
+        old_movie_id = movie_id.deleted[0] if movie_id.deleted else review.movie_id
+        record_change(object_session(review), old_user_id, old_movie_id, None)
+    record_change(object_session(review), review.user_id, review.movie_id, review.rating)
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    record_change(object_session(review), review.user_id, review.movie_id, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _session_committed(session):
+    session.info.pop(_DIRTY, None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _session_rolled_back(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_DIRTY, None)
+
+
+def get_engine():
+    """Returns the rating matrix for the current app, brought up to date with the committed reviews."""
+    return _engine_cache().get(db.session)
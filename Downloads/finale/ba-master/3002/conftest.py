@@ -1,11 +1,10 @@
 import pytest
-from app import app, db
+from app import create_app, db
+from config import TestingConfig
 
 @pytest.fixture(scope="module")
 def test_client():
-    app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app = create_app(TestingConfig)
 
     with app.app_context():
         db.create_all()
@@ -0,0 +1,40 @@
+# db_engine.py
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database: a sized pool, except for in-memory SQLite."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if is_memory_sqlite(uri):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+    if make_url(uri).get_backend_name() != 'sqlite':
+        # Servers drop idle connections; SQLite files don't
+        options.update(pool_recycle=config['DB_POOL_RECYCLE'], pool_pre_ping=True)
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Runs the PRAGMAs on every new connection of a SQLite engine; other engines are left alone."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if name == 'journal_mode' and is_memory_sqlite(str(engine.url)):
+                continue  # In-memory databases can't use WAL
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
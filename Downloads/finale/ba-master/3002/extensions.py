@@ -0,0 +1,6 @@
+# extensions.py
+
+from flask_caching import Cache
+
+# Shared cache instance, initialised against the app in app.py
+cache = Cache()
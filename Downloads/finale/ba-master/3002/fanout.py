@@ -0,0 +1,50 @@
+# fanout.py
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app
+
+# Shared worker pool for page-level fan-out (sized for a handful of concurrent page loads)
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 16))
+FANOUT_TIMEOUT = 4.0  # Overall deadline in seconds, override with app.config['FANOUT_TIMEOUT']
+
+executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+
+
+def with_app_context(fn, app=None):
+    """Wraps a callable so it runs inside an application context on a worker thread."""
+    app = app or current_app._get_current_object()
+
+    def run(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return run
+
+
+def fetch_concurrently(tasks, timeout=None, default=list):
+    """
+    Runs independent fetches concurrently and returns a dict of {name: result}.
+
+    `tasks` maps a section name to a zero-argument callable. Sections that raise or
+    miss the overall deadline get `default()` so the page renders without them.
+    """
+    if timeout is None:
+        timeout = current_app.config.get('FANOUT_TIMEOUT', FANOUT_TIMEOUT)
+
+    app = current_app._get_current_object()
+    futures = {name: executor.submit(with_app_context(fn, app)) for name, fn in tasks.items()}
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            logging.warning(f"Fan-out section '{name}' missed the {timeout}s deadline, rendering it empty")
+            results[name] = default()
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logging.error(f"Fan-out section '{name}' failed: {e}")
+            results[name] = default()
+    return results
@@ -0,0 +1,29 @@
+# fixtures.py
+
+import unittest
+from sqlalchemy import insert
+from app import create_app
+from config import TestingConfig
+from models import db, User
+
+
+def add_users(*user_ids):
+    """Inserts bare users with the given ids (skipping password hashing) so reviews satisfy their foreign key."""
+    db.session.execute(insert(User), [
+        {'id': user_id, 'username': f'user{user_id}', 'password_hash': '!'} for user_id in user_ids
+    ])
+    db.session.commit()
+
+
+class AppTestCase(unittest.TestCase):
+    """Runs each test inside its own create_app(TestingConfig) app, on a fresh in-memory database."""
+
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
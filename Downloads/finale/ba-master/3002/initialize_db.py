@@ -1,6 +1,5 @@
 # initialize_db.py
-from app import db, app
+from app import create_app
 
-with app.app_context():
-    db.create_all()
+with create_app(warm_cache=False).app_context():  # create_app() creates the tables and applies pending migrations
     print("Database tables created successfully.")
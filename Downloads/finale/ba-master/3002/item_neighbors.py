@@ -0,0 +1,78 @@
+# item_neighbors.py
+
+import logging
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import delete, insert
+from cf_engine import RatingMatrix
+from models import db, ItemNeighbor
+
+# Neighbours kept per movie, and the fewest users that must have rated both movies
+ITEM_NEIGHBORS_K = 20
+MIN_CO_RATERS = 2
+# Movies whose similarity rows are computed per sparse product (bounds memory on large catalogues)
+BUILD_CHUNK = 1000
+
+
+def compute_item_neighbors(engine, k=ITEM_NEIGHBORS_K, method='adjusted_cosine', min_co_raters=MIN_CO_RATERS):
+    """
+    Yields (movie_id, neighbor_id, score) for the top-`k` most similar movies of every rated movie.
+
+    Similarity is cosine over the users who rated both movies; 'adjusted_cosine' first subtracts
+    each user's mean rating so generous and harsh raters are comparable.
+    """
+    ratings = engine.R.copy()
+    if method == 'adjusted_cosine':
+        counts = np.diff(ratings.indptr)
+        means = np.divide(np.asarray(ratings.sum(axis=1)).ravel(), counts, out=np.zeros(len(counts)), where=counts > 0)
+        ratings.data = ratings.data - np.repeat(means, counts)
+
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    by_item = ratings.T.tocsr()
+    rated_by_item = engine.B.T.tocsr()
+
+    for start in range(0, by_item.shape[0], BUILD_CHUNK):
+        # Both products stay sparse: only movie pairs that share at least one rater are materialized
+        co_raters = (rated_by_item[start:start + BUILD_CHUNK] @ engine.B) >= min_co_raters
+        dots = (by_item[start:start + BUILD_CHUNK] @ ratings).multiply(co_raters).tocsr()
+
+        for offset in range(dots.shape[0]):
+            item = start + offset
+            cols = dots.indices[dots.indptr[offset]:dots.indptr[offset + 1]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = dots.data[dots.indptr[offset]:dots.indptr[offset + 1]] / (norms[item] * norms[cols])
+            keep = (cols != item) & np.isfinite(scores) & (scores > 0)
+            cols, scores = cols[keep], scores[keep]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                cols, scores = cols[top], scores[top]
+            for j in np.argsort(-scores, kind='stable'):
+                yield int(engine.movie_ids[item]), int(engine.movie_ids[cols[j]]), float(scores[j])
+
+
+def build_item_neighbors(k=ITEM_NEIGHBORS_K, method='adjusted_cosine'):
+    """Recomputes the item_neighbors table from every review and swaps it in one transaction."""
+    started = time.time()
+    engine = RatingMatrix.from_reviews()
+    computed_at = datetime.utcnow()
+    rows = [
+        {'movie_id': movie_id, 'neighbor_id': neighbor_id, 'score': score, 'computed_at': computed_at}
+        for movie_id, neighbor_id, score in compute_item_neighbors(engine, k, method)
+    ]
+
+    db.session.execute(delete(ItemNeighbor))
+    if rows:
+        db.session.execute(insert(ItemNeighbor), rows)
+    db.session.commit()
+
+    logging.info(f"Built {len(rows)} item neighbours for {len(engine.movie_ids)} movies in {time.time() - started:.1f}s")
+    return len(rows)
+
+
+if __name__ == '__main__':
+    # For cron/schedulers: python item_neighbors.py (same as `flask build-item-neighbors`)
+    from app import create_app
+
+    with create_app(warm_cache=False).app_context():
+        print(f"Wrote {build_item_neighbors()} item neighbours.")
@@ -0,0 +1,173 @@
+# mf_model.py
+
+import logging
+import os
+import threading
+import time
+import numpy as np
+from ann_index import build_index_from_model
+from cf_engine import RatingMatrix
+from extensions import cache
+from models import db, Review
+
+# Latent factor model hyper-parameters (ALS with weighted-lambda regularization)
+MF_FACTORS = 32
+MF_REGULARIZATION = 0.1
+MF_ITERATIONS = 15
+MF_MODEL_PATH = os.environ.get('MF_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'mf_model.npz'))
+# Folded-in user vectors are shared between workers through the cache until the next retrain
+FOLD_IN_TIMEOUT = 7 * 86400
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+class FactorModel:
+    """User and movie factor matrices (float32) plus the global mean rating."""
+
+    def __init__(self, user_ids, movie_ids, user_factors, item_factors, global_mean, trained_at=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+        self.global_mean = float(global_mean)
+        self.trained_at = float(trained_at if trained_at is not None else time.time())
+        self.user_index = {int(user_id): i for i, user_id in enumerate(self.user_ids)}
+        self.movie_index = {int(movie_id): i for i, movie_id in enumerate(self.movie_ids)}
+
+    @classmethod
+    def train(cls, engine, factors=MF_FACTORS, regularization=MF_REGULARIZATION, iterations=MF_ITERATIONS, seed=0):
+        """Alternating least squares over a cf_engine.RatingMatrix."""
+        R = engine.R.astype(np.float64)
+        global_mean = R.data.mean() if R.nnz else 0.0
+        R.data -= global_mean
+        Rt = R.T.tocsr()
+
+        rng = np.random.default_rng(seed)
+        users = rng.normal(0, 0.1, (R.shape[0], factors))
+        items = rng.normal(0, 0.1, (R.shape[1], factors))
+        for _ in range(iterations):
+            users = _solve_rows(R, items, regularization)
+            items = _solve_rows(Rt, users, regularization)
+
+        return cls(engine.user_ids, engine.movie_ids, users, items, global_mean)
+
+    def save(self, path=MF_MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, user_ids=self.user_ids, movie_ids=self.movie_ids, user_factors=self.user_factors,
+                 item_factors=self.item_factors, global_mean=self.global_mean, trained_at=self.trained_at)
+        os.replace(tmp_path, path)  # Readers never see a half-written model
+
+    @classmethod
+    def load(cls, path=MF_MODEL_PATH):
+        with np.load(path) as data:
+            return cls(data['user_ids'], data['movie_ids'], data['user_factors'], data['item_factors'],
+                       data['global_mean'], data['trained_at'])
+
+    def fold_in(self, ratings, regularization=MF_REGULARIZATION):
+        """Solves one user's vector from {movie_id: rating} against the fixed movie factors."""
+        known = [(self.movie_index[movie_id], rating) for movie_id, rating in ratings.items() if movie_id in self.movie_index]
+        if not known:
+            return None
+        idx, values = zip(*known)
+        Y = self.item_factors[list(idx)].astype(np.float64)
+        A = Y.T @ Y + regularization * len(idx) * np.eye(Y.shape[1])
+        b = Y.T @ (np.array(values, dtype=np.float64) - self.global_mean)
+        return np.linalg.solve(A, b).astype(np.float32)
+
+    def recommend(self, user_vector, n=20, exclude=()):
+        """Top-`n` (movie_id, predicted rating) pairs: one matrix-vector product plus argpartition."""
+        scores = self.item_factors @ user_vector + self.global_mean
+        excluded = [self.movie_index[movie_id] for movie_id in exclude if movie_id in self.movie_index]
+        scores[excluded] = -np.inf
+        n = min(n, len(scores) - len(excluded))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in top]
+
+
+def _solve_rows(R, fixed, regularization):
+    """One ALS half-step: solves every row of R against the fixed factor matrix."""
+    factors = fixed.shape[1]
+    solved = np.zeros((R.shape[0], factors))
+    eye = np.eye(factors)
+    for row in range(R.shape[0]):
+        start, end = R.indptr[row], R.indptr[row + 1]
+        if start == end:
+            continue
+        Y = fixed[R.indices[start:end]]
+        solved[row] = np.linalg.solve(Y.T @ Y + regularization * (end - start) * eye, Y.T @ R.data[start:end])
+    return solved
+
+
+def train_factor_model(path=MF_MODEL_PATH, **kwargs):
+    """Trains on every review, saves the model and rebuilds the ANN index; run from the CLI or a scheduler."""
+    started = time.time()
+    engine = RatingMatrix.from_reviews()
+    model = FactorModel.train(engine, **kwargs)
+    model.save(path)
+    build_index_from_model(model)
+    logging.info(f"Trained factor model on {engine.R.nnz} ratings ({len(model.user_ids)} users, "
+                 f"{len(model.movie_ids)} movies) in {time.time() - started:.1f}s")
+    return model
+
+
+def get_model(path=MF_MODEL_PATH):
+    """Returns the saved model, reloading it when the file changes; None until one has been trained."""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _model_lock:
+        if _model is None or mtime != _model_mtime:
+            _model, _model_mtime = FactorModel.load(path), mtime
+        return _model
+
+
+def _fold_in_key(model, user_id):
+    return f"mf_user_{int(model.trained_at)}_{user_id}"
+
+
+def fold_in_user(user_id):
+    """Refreshes one user's vector from their current ratings (call after they rate a movie)."""
+    model = get_model()
+    if model is None:
+        return None
+    ratings = {review.movie_id: review.rating for review in Review.query.filter_by(user_id=user_id).order_by(Review.id)}
+    vector = model.fold_in(ratings)
+    if vector is not None:
+        cache.set(_fold_in_key(model, user_id), vector.tolist(), timeout=FOLD_IN_TIMEOUT)
+    return vector
+
+
+def recommend_for_user(user_id, n=20):
+    """Top-`n` movie IDs the user hasn't rated, or [] when there's no model or the user has no usable ratings."""
+    model = get_model()
+    if model is None:
+        return []
+
+    rated = {movie_id for (movie_id,) in db.session.query(Review.movie_id).filter(Review.user_id == user_id)}
+    vector = cache.get(_fold_in_key(model, user_id))
+    if vector is not None:
+        vector = np.asarray(vector, dtype=np.float32)
+    elif user_id in model.user_index:
+        vector = model.user_factors[model.user_index[user_id]]
+    else:
+        vector = fold_in_user(user_id)
+    if vector is None:
+        return []
+    return [movie_id for movie_id, score in model.recommend(vector, n=n, exclude=rated)]
+
+
+if __name__ == '__main__':
+    # For cron/schedulers: python mf_model.py (same as `flask train-factor-model`)
+    from app import create_app
+
+    with create_app(warm_cache=False).app_context():
+        train_factor_model()
+        print(f"Saved factor model to {MF_MODEL_PATH}.")
@@ -0,0 +1,160 @@
+# migrations.py
+
+import logging
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from models import db, Movie, Review, UserMovies, UserGenreProfile
+from rating_stats import rebuild_rating_stats
+
+# Applied migrations, one row per version
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_indexes(*names):
+    def create(connection):
+        for table in (Review.__table__, UserMovies.__table__):
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(connection, checkfirst=True)
+    return create
+
+
+def _dedupe_reviews(connection):
+    """Keeps each user's latest review of a movie; their genre profiles are rebuilt on next use."""
+    reviews = Review.__table__
+    keep = select(db.func.max(reviews.c.id)).group_by(reviews.c.user_id, reviews.c.movie_id)
+    affected = [
+        row.user_id for row in connection.execute(
+            select(reviews.c.user_id).group_by(reviews.c.user_id, reviews.c.movie_id).having(db.func.count() > 1)
+        )
+    ]
+    if not affected:
+        return
+    removed = connection.execute(delete(reviews).where(reviews.c.id.not_in(keep))).rowcount
+    connection.execute(delete(UserGenreProfile.__table__).where(UserGenreProfile.user_id.in_(set(affected))))
+    logging.warning(f"Removed {removed} duplicate reviews for {len(set(affected))} users")
+
+
+def _dedupe_user_movies(connection):
+    """Keeps the first entry for each (user, movie, list)."""
+    user_movies = UserMovies.__table__
+    keep = select(db.func.min(user_movies.c.id)).group_by(
+        user_movies.c.user_id, user_movies.c.movie_id, user_movies.c.category
+    )
+    removed = connection.execute(delete(user_movies).where(user_movies.c.id.not_in(keep))).rowcount
+    if removed:
+        logging.warning(f"Removed {removed} duplicate watchlist/favorites entries")
+
+
+def _dedupe_and_index(dedupe, *names):
+    def migrate(connection):
+        dedupe(connection)
+        _create_indexes(*names)(connection)
+    return migrate
+
+
+def _add_columns(table, defaults):
+    """
+    Adds the model columns (and their indexes) missing from an existing table. `defaults` gives the SQL
+    literal that fills each NOT NULL column on the rows already there.
+    """
+    def add(connection):
+        existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = str(CreateColumn(column).compile(dialect=connection.dialect))
+            if column.name in defaults:
+                ddl += f" DEFAULT {defaults[column.name]}"
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    return add
+
+
+def _require_review_dates(connection):
+    """Backfills missing review dates (they page as the oldest reviews) and makes created_at NOT NULL."""
+    reviews = Review.__table__
+    filled = connection.execute(
+        update(reviews).where(reviews.c.created_at.is_(None)).values(created_at=datetime(1970, 1, 1))
+    ).rowcount
+    if filled:
+        logging.warning(f"Backfilled created_at for {filled} reviews")
+    if connection.dialect.name == 'sqlite':
+        # SQLite can't add NOT NULL to an existing column without rebuilding the table; triggers enforce it
+        for name, operation in (('insert', 'INSERT'), ('update', 'UPDATE OF created_at')):
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_reviews_created_at_{name} BEFORE {operation} ON reviews "
+                "WHEN NEW.created_at IS NULL BEGIN SELECT RAISE(ABORT, 'NOT NULL constraint failed: reviews.created_at'); END"
+            ))
+    else:
+        connection.execute(text("ALTER TABLE reviews ALTER COLUMN created_at SET NOT NULL"))
+
+
+# Changes to tables that already exist: (version, description, callable(connection)). New tables are
+# created straight from models.py. Append only, never renumber, and keep every step safe to re-run:
+# two processes starting at once may both apply one before either records it.
+MIGRATIONS = [
+    (1, 'hot-path review and list indexes', _create_indexes(
+        'ix_reviews_movie_rating_user', 'ix_reviews_user_rating', 'ix_reviews_movie_created',
+        'ix_user_movies_user_category_id')),
+    (2, 'one review per user and movie', _dedupe_and_index(_dedupe_reviews, 'uq_reviews_user_movie')),
+    (3, 'one list entry per user, movie and category',
+     _dedupe_and_index(_dedupe_user_movies, 'uq_user_movies_user_movie_category')),
+    (4, 'backfill movie rating stats', lambda connection: rebuild_rating_stats(connection)),
+    # Rows from before the catalogue count as list entries last seen long ago, so they are refetched
+    (5, 'catalogue columns on movies', _add_columns(
+        Movie.__table__, {'has_details': 'false', 'updated_at': "'1970-01-01 00:00:00'"})),
+    (6, 'review dates are required', _require_review_dates),
+]
+
+
+def current_version(connection):
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(select(db.func.max(schema_version.c.version))).scalar() or 0
+
+
+def migrate(engine=None, target=None):
+    """
+    Creates missing tables, then brings existing ones up to `target` (default: the latest version),
+    one transaction per migration. Returns the list of versions applied.
+    """
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        # A fresh database gets every current table and index here, leaving the migrations no-ops
+        db.metadata.create_all(connection, checkfirst=True)
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as connection:
+            if version <= current_version(connection):
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            step(connection)
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(schema_version).values(
+                        version=version, description=description, applied_at=datetime.utcnow()
+                    ))
+            except IntegrityError:
+                continue  # Another process recorded it first
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    # Apply pending migrations to the configured database: python migrations.py
+    from app import create_app
+
+    with create_app(warm_cache=False).app_context():  # create_app() runs migrate() against its database
+        with db.engine.connect() as connection:
+            print(f"Schema is at version {current_version(connection)}.")
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
@@ -6,6 +7,17 @@ from datetime import datetime
 # Initialize the SQLAlchemy database instance
 db = SQLAlchemy()
 
+# INSERT constructs with on_conflict_do_update/on_conflict_do_nothing, per dialect
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def dialect_insert(model, bind=None):
+    """Returns an upsert-capable INSERT for `model` on the dialect of `bind` (a connection or session, default db.session)."""
+    bind = bind if bind is not None else db.session
+    dialect = bind.dialect if hasattr(bind, 'dialect') else bind.get_bind().dialect
+    if dialect.name not in _UPSERT_INSERTS:
+        raise NotImplementedError(f"Upserts are not supported on {dialect.name}")
+    return _UPSERT_INSERTS[dialect.name](model.__table__ if hasattr(model, '__table__') else model)
+
 class User(UserMixin, db.Model):
     """Model for storing user details."""
     __tablename__ = 'users'
@@ -50,6 +62,12 @@ class UserMovies(db.Model):
     movie_id = db.Column(db.Integer, nullable=False)
     category = db.Column(db.String(50), nullable=False)  # 'watchlist' or 'favorites'
 
+    # One entry per movie and list; the second index serves "latest in list" lookups
+    __table_args__ = (
+        db.Index('uq_user_movies_user_movie_category', 'user_id', 'movie_id', 'category', unique=True),
+        db.Index('ix_user_movies_user_category_id', 'user_id', 'category', 'id'),
+    )
+
     # Relationship to access the user who added the movie
     user = db.relationship('User', backref=db.backref('user_movies', lazy=True))
 
@@ -62,25 +80,115 @@ class Review(db.Model):
     movie_id = db.Column(db.Integer, nullable=False)
     rating = db.Column(db.Float, nullable=False)
     review_text = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Keyset pagination key
+
+    # Indexes are applied to existing databases by migrations.py; keep the two in step
+    __table_args__ = (
+        # One review per user and movie; also serves lookups of a user's review of a movie
+        db.Index('uq_reviews_user_movie', 'user_id', 'movie_id', unique=True),
+        # Neighbour discovery: reviews of a movie above a rating threshold, by user
+        db.Index('ix_reviews_movie_rating_user', 'movie_id', 'rating', 'user_id'),
+        # A user's reviews above a rating threshold (recent favourites, genre profiles)
+        db.Index('ix_reviews_user_rating', 'user_id', 'rating'),
+        # A movie's reviews, newest first
+        db.Index('ix_reviews_movie_created', 'movie_id', 'created_at', 'id'),
+    )
 
+    # Relationship to access the user who made the review
+    user = db.relationship('User', backref=db.backref('reviews', lazy=True))
 
+    def to_dict(self):
+        """Returns the review as rendered on the movie details page."""
+        return {
+            'id': self.id,
+            'username': self.user.username if self.user else None,
+            'rating': self.rating,
+            'review_text': self.review_text,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M') if self.created_at else None
+        }
 
 
-    # Relationship to access the user who made the review
-    user = db.relationship('User', backref=db.backref('reviews', lazy=True))
+class UserGenreProfile(db.Model):
+    """Per-user genre profile: how many of the user's movies rated >= 4 carry each genre."""
+    __tablename__ = 'user_genre_profiles'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    genre_counts = db.Column(db.JSON, nullable=False, default=dict)  # {"28": 3, "878": 1, ...}
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ItemNeighbor(db.Model):
+    """Precomputed top-K most similar movies per movie, rebuilt offline by item_neighbors.py."""
+    __tablename__ = 'item_neighbors'
+
+    movie_id = db.Column(db.Integer, primary_key=True)
+    neighbor_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class MovieRatingStats(db.Model):
+    """Review count and rating sum per movie, kept in step with reviews by rating_stats.py."""
+    __tablename__ = 'movie_rating_stats'
+
+    movie_id = db.Column(db.Integer, primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class ReviewVersion(db.Model):
+    """Single row counting review changes; writers bump it in their own transaction (see cf_engine.py)."""
+    __tablename__ = 'review_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReviewChange(db.Model):
+    """Recent review changes by version, replayed by every worker's rating matrix (see cf_engine.py)."""
+    __tablename__ = 'review_changes'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=True)  # NULL: reload every review
+    movie_id = db.Column(db.Integer, nullable=True)
+    rating = db.Column(db.Float, nullable=True)  # NULL: review deleted
 
 
 class Movie(db.Model):
-    """Model for storing movie details."""
+    """Local catalogue of TMDB movies, written through from detail lookups and list fetches."""
     __tablename__ = 'movies'
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)  # TMDB movie ID
     title = db.Column(db.String(255), nullable=False)
-    genre = db.Column(db.String(100), nullable=True)
+    overview = db.Column(db.Text, nullable=True)
     release_date = db.Column(db.Date, nullable=True)
     language = db.Column(db.String(50), nullable=True)
     rating = db.Column(db.Float, nullable=True)
+    genres = db.Column(db.JSON, nullable=True)  # [{'id': 28, 'name': 'Action'}, ...]
+    genre_ids = db.Column(db.JSON, nullable=True)
+    director = db.Column(db.String(255), nullable=True)
+    main_characters = db.Column(db.JSON, nullable=True)
+    poster = db.Column(db.String(255), nullable=True)
+    backdrop = db.Column(db.String(255), nullable=True)
+    has_details = db.Column(db.Boolean, nullable=False, default=False)  # False for rows seen only in lists
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        """Returns the movie in the same shape as utils.compact_movie_details."""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'overview': self.overview or '',
+            'release_date': self.release_date.isoformat() if self.release_date else '',
+            'rating': self.rating if self.rating is not None else 'N/A',
+            'original_language': self.language or 'N/A',
+            'genres': self.genres or [],
+            'genre_ids': self.genre_ids or [],
+            'director': self.director or "Not Available",
+            'main_characters': self.main_characters or ["No main characters available"],
+            'poster': self.poster,
+            'backdrop': self.backdrop
+        }
 
     def __repr__(self):
         return f"<Movie {self.title}>"
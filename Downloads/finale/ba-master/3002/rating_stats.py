@@ -0,0 +1,97 @@
+# rating_stats.py
+
+import logging
+from sqlalchemy import event, func, inspect, insert, select, update, delete
+from models import db, dialect_insert, Review, MovieRatingStats
+
+# Shown instead of an average for movies nobody has rated
+NO_RATINGS = "No ratings yet"
+
+_stats = MovieRatingStats.__table__
+
+
+def _apply(connection, movie_id, count, total):
+    """Adds `count` reviews summing to `total` to a movie's row in one upsert, creating the row on its first review."""
+    stmt = dialect_insert(_stats, connection).values(movie_id=movie_id, review_count=count, rating_sum=total)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[_stats.c.movie_id],
+        set_={
+            'review_count': _stats.c.review_count + stmt.excluded.review_count,
+            'rating_sum': _stats.c.rating_sum + stmt.excluded.rating_sum
+        }
+    ))
+
+
+def lock_movie_stats(connection, movie_id):
+    """
+    Upserts a no-op change into the movie's row as the transaction's first write. Until commit this holds
+    the row lock (PostgreSQL) or the database write lock (SQLite, waiting up to busy_timeout), so writes
+    that start here run one at a time per movie and each one reads the reviews the previous one committed.
+    """
+    _apply(connection, movie_id, 0, 0)
+
+
+def refresh_movie_stats(connection, movie_id):
+    """Recomputes a locked movie's row from its reviews, for writes that bypass the ORM (covered by ix_reviews_movie_rating_user)."""
+    count, total = connection.execute(
+        select(func.count(), func.coalesce(func.sum(Review.rating), 0)).where(Review.movie_id == movie_id)
+    ).one()
+    connection.execute(update(_stats).where(_stats.c.movie_id == movie_id).values(review_count=count, rating_sum=total))
+
+
+# Mapper events run inside the flush, so the summary commits or rolls back together with the review.
+# Bulk query.update()/query.delete() on reviews bypass them; run rebuild_rating_stats() afterwards.
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    _apply(connection, review.movie_id, 1, review.rating)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    state = inspect(review)
+    rating, movie_id = state.attrs.rating.history, state.attrs.movie_id.history
+    if not rating.has_changes() and not movie_id.has_changes():
+        return
+    old_rating = rating.deleted[0] if rating.deleted else review.rating
+    old_movie_id = movie_id.deleted[0] if movie_id.deleted else review.movie_id
+    _apply(connection, old_movie_id, -1, -old_rating)
+    _apply(connection, review.movie_id, 1, review.rating)
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    _apply(connection, review.movie_id, -1, -review.rating)
+
+
+def avg_ratings(movie_ids):
+    """Returns {movie_id: average rating rounded to 1 decimal} for the rated movies among `movie_ids`, in one query."""
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if not movie_ids:
+        return {}
+    rows = db.session.execute(
+        select(_stats.c.movie_id, _stats.c.review_count, _stats.c.rating_sum).where(
+            _stats.c.movie_id.in_(movie_ids),
+            _stats.c.review_count > 0
+        )
+    )
+    return {row.movie_id: round(row.rating_sum / row.review_count, 1) for row in rows}
+
+
+def rebuild_rating_stats(connection=None):
+    """
+    Recomputes the whole summary from the reviews table; returns the number of movies.
+    Runs on `connection` inside the caller's transaction (migrations), otherwise in the session and commits.
+    """
+    executor = connection if connection is not None else db.session
+    executor.execute(delete(_stats))
+    executor.execute(
+        insert(_stats).from_select(
+            ['movie_id', 'review_count', 'rating_sum'],
+            select(Review.movie_id, func.count(Review.id), func.sum(Review.rating)).group_by(Review.movie_id)
+        )
+    )
+    if connection is None:
+        db.session.commit()
+    count = executor.execute(select(func.count()).select_from(_stats)).scalar()
+    logging.info(f"Rebuilt rating stats for {count} movies")
+    return count
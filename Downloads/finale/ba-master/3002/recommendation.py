@@ -1,97 +1,168 @@
 # recommendation.py
 
-import requests
-import os
-from models import UserMovies, Review  
-from utils import get_movie_details, get_movie_recommendations,cache
+from models import db, dialect_insert, UserMovies, Review, UserGenreProfile, ItemNeighbor
+from utils import get_movie_details, get_movie_details_many, cache, MISSING_MOVIE_TIMEOUT
+from tmdb_client import tmdb
+from tmdb_helpers import get_trending_movies
+from fanout import with_app_context
+from swr import get_or_fetch, Negative
+from cf_engine import get_engine
+from mf_model import recommend_for_user
+from ann_index import similar_movie_ids
 from datetime import datetime, timedelta
-from collections import defaultdict
-from sqlalchemy import and_
+from collections import Counter, defaultdict
 import numpy as np
+from sqlalchemy import and_, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import os
 
-# TMDB API Key and Base URL for movie database interactions
-API_KEY = os.environ.get('TMDB_API_KEY', '9ba93d1cf5e3054788a377f636ea1033')
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+# Most overlapping neighbours considered per user
+SIMILAR_USERS_LIMIT = 200
 
 # Function to find similar users based on common highly-rated movies
-def get_similar_users(user_id):
+def get_similar_users(user_id, limit=SIMILAR_USERS_LIMIT):
     """
-    Find users who have rated at least 2 movies >= 4 in common with the current user.
+    Find users who have rated at least 2 movies >= 5 in common with the current user,
+    most overlap first, in a single aggregated self-join over reviews.
     """
-    # Fetch movies rated >= 4 by the current user
-    current_user_movies = Review.query.filter_by(user_id=user_id).filter(Review.rating >= 5).all()
-    current_user_movie_ids = {review.movie_id for review in current_user_movies}
-
-    # Find users who share these moviesD
-    similar_users = defaultdict(int)  # {user_id: shared_movie_count}
-
-    # Find users who share these movies
-    for movie_id in current_user_movie_ids:
-        # Find other users who rated the same movie >= 5
-        shared_reviews = Review.query.filter(
-            Review.movie_id == movie_id,
-            Review.rating >= 5
-        ).all()
+    mine = aliased(Review)
+    theirs = aliased(Review)
+    shared = func.count(func.distinct(theirs.movie_id)).label('shared')
 
-        for review in shared_reviews:
-            if review.user_id != user_id:
-                similar_users[review.user_id] += 1
+    rows = db.session.query(theirs.user_id, shared).join(
+        mine, and_(mine.movie_id == theirs.movie_id, mine.user_id == user_id, mine.rating >= 5)
+    ).filter(
+        theirs.rating >= 5,
+        theirs.user_id != user_id
+    ).group_by(theirs.user_id).having(shared >= 2).order_by(shared.desc(), theirs.user_id).limit(limit).all()
 
-    # Return users who have at least 2 shared movies
-    return [user_id for user_id, count in similar_users.items() if count >= 2]
+    return [row.user_id for row in rows]
 
 # Function to calculate similarity between two users
 def calculate_similarity(user_id, other_user_id):
     """
-    Calculate similarity between two users based on their ratings.
+    Calculate similarity (Pearson over co-rated movies) between two users based on their ratings.
     """
-    user_ratings = Review.query.filter_by(user_id=user_id).all()
-    other_user_ratings = Review.query.filter_by(user_id=other_user_id).all()
-
-    # Map movie IDs to ratings for both users
-    user_movie_ratings = {r.movie_id: r.rating for r in user_ratings}
-    other_movie_ratings = {r.movie_id: r.rating for r in other_user_ratings}
-
-    # Find movies rated by both users
-    common_movie_ids = set(user_movie_ratings.keys()).intersection(other_movie_ratings.keys())
-
-    if not common_movie_ids:
-        return 0  # No similarity if no shared movies
-
-    # Extract ratings for common movies
-    user_ratings_vector = np.array([user_movie_ratings[movie_id] for movie_id in common_movie_ids])
-    other_ratings_vector = np.array([other_movie_ratings[movie_id] for movie_id in common_movie_ids])
-
-    # Compute Pearson correlation if sufficient data is available
-    if len(user_ratings_vector) > 1:  # Correlation requires at least two data points
-        similarity = np.corrcoef(user_ratings_vector, other_ratings_vector)[0, 1]
-        return 0 if np.isnan(similarity) else similarity
+    return get_engine().similarity(user_id, [other_user_id])[other_user_id]
+
+# Ratings at or above this count towards a user's genre profile
+GENRE_PROFILE_MIN_RATING = 4
+
+def _count_genres(movie_ids, details):
+    """Counts genres over the given movies; returns None if any movie's details are unavailable."""
+    counts = Counter()
+    for movie_id in movie_ids:
+        if details.get(movie_id) is None:
+            return None
+        counts.update(details[movie_id].get('genre_ids', []))
+    return counts
+
+def _store_genre_profiles(profiles):
+    """Upserts built profiles in a session of their own, so the request's transaction is never committed early."""
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user_id, 'genre_counts': {str(g): c for g, c in counts.items()}, 'updated_at': now}
+        for user_id, counts in profiles.items()
+    ]
+    try:
+        with Session(db.engine) as session:
+            stmt = dialect_insert(UserGenreProfile, session).values(rows)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[UserGenreProfile.user_id],
+                set_={'genre_counts': stmt.excluded.genre_counts, 'updated_at': stmt.excluded.updated_at}
+            ))
+            session.commit()
+    except SQLAlchemyError as e:
+        logging.warning(f"Storing genre profiles failed: {e}")
+
+def get_genre_profiles(user_ids):
+    """
+    Returns {user_id: Counter(genre_id -> count)} from the stored profiles, building missing ones
+    from the users' highly rated movies in one batch. Profiles are only stored once every movie's
+    details were available, so a TMDB outage never persists an incomplete profile.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    profiles = {
+        profile.user_id: Counter({int(genre_id): count for genre_id, count in profile.genre_counts.items()})
+        for profile in UserGenreProfile.query.filter(UserGenreProfile.user_id.in_(user_ids)).all()
+    }
 
-    return 0
+    missing = [user_id for user_id in user_ids if user_id not in profiles]
+    if missing:
+        rated = defaultdict(list)
+        for user_id, movie_id in db.session.query(Review.user_id, Review.movie_id).filter(
+                Review.user_id.in_(missing), Review.rating >= GENRE_PROFILE_MIN_RATING):
+            rated[user_id].append(movie_id)
+
+        # One batch lookup covers the movies of every missing user
+        movie_ids = list(dict.fromkeys(movie_id for user_id in missing for movie_id in rated[user_id]))
+        details = dict(zip(movie_ids, get_movie_details_many(movie_ids)))
+
+        built = {}
+        for user_id in missing:
+            counts = _count_genres(rated[user_id], details)
+            profiles[user_id] = counts if counts is not None else Counter()
+            if counts is not None:
+                built[user_id] = counts
+        if built:
+            _store_genre_profiles(built)
+
+    return profiles
+
+def apply_genre_profile_change(user_id, genre_ids, old_rating, new_rating):
+    """
+    Applies one rating change to the stored profile in the current transaction without committing.
+    `genre_ids` is None when the movie's genres are unknown; the profile is then dropped and rebuilt
+    on next use. Users without a stored profile get one built lazily by get_genre_profiles.
+    """
+    profile = db.session.get(UserGenreProfile, user_id, with_for_update=True)  # Same user, other movies
+    if profile is None:
+        return
+    delta = int(new_rating >= GENRE_PROFILE_MIN_RATING) - int(old_rating is not None and old_rating >= GENRE_PROFILE_MIN_RATING)
+    if not delta:
+        return
+    if genre_ids is None:
+        db.session.delete(profile)  # Can't apply the change; rebuild on next use
+        return
+
+    counts = Counter(profile.genre_counts)
+    for genre_id in genre_ids:
+        counts[str(genre_id)] += delta
+    profile.genre_counts = {genre_id: count for genre_id, count in counts.items() if count > 0}
+
+def get_genre_similarities(user_id, other_user_ids):
+    """
+    Jaccard similarity of the user's genre set against many users at once: the profiles become
+    a boolean user x genre matrix, and intersections are one matrix-vector product.
+    """
+    profiles = get_genre_profiles([user_id] + list(other_user_ids))
+    vocabulary = sorted(set().union(*profiles.values()))
+    if not vocabulary or not other_user_ids:
+        return {other: 0.0 for other in other_user_ids}
+
+    column = {genre_id: i for i, genre_id in enumerate(vocabulary)}
+    def genre_vector(profile):
+        vector = np.zeros(len(vocabulary), dtype=np.int32)
+        vector[[column[genre_id] for genre_id in profile]] = 1
+        return vector
+
+    user_vector = genre_vector(profiles[user_id])
+    others = np.array([genre_vector(profiles[other]) for other in other_user_ids])
+    intersection = others @ user_vector
+    union = others.sum(axis=1) + user_vector.sum() - intersection
+    similarities = intersection / np.maximum(union, 1)  # Avoid division by zero
+    return {other: float(similarity) for other, similarity in zip(other_user_ids, similarities)}
 
 # Function to compare genre preferences between two users
 def get_genre_similarity(user_id, other_user_id):
     """
     Compare user preferences based on genres rated highly.
     """
-    # Fetch highly-rated movies for both users
-    user_movies = Review.query.filter_by(user_id=user_id).filter(Review.rating >= 4).all()
-    other_user_movies = Review.query.filter_by(user_id=other_user_id).filter(Review.rating >= 4).all()
-
-    # Extract genre IDs for each user's movies
-    user_genres = set()
-    for movie in user_movies:
-        details = get_movie_details(movie.movie_id)
-        user_genres.update(details.get('genre_ids', []))
-
-    other_genres = set()
-    for movie in other_user_movies:
-        details = get_movie_details(movie.movie_id)
-        other_genres.update(details.get('genre_ids', []))
-
-    # Calculate genre overlap
-    common_genres = user_genres.intersection(other_genres)
-    return len(common_genres) / max(len(user_genres.union(other_genres)), 1)  # Avoid division by zero
+    return get_genre_similarities(user_id, [other_user_id])[other_user_id]
 
 # Function to generate collaborative recommendations
 def get_collaborative_recommendations(user_id):
@@ -99,53 +170,88 @@ def get_collaborative_recommendations(user_id):
     Generate collaborative recommendations by incorporating similarity and genre filtering.
     """
     similar_users = get_similar_users(user_id)
-    print(f"[DEBUG] Similar users for user {user_id}: {similar_users}")
+    logging.debug(f"Similar users for user {user_id}: {similar_users}")
     recommendations = []
 
-    # Fetch the genres preferred by the current user
-    user_movies = Review.query.filter_by(user_id=user_id).filter(Review.rating >= 4).all()
-    print(f"[DEBUG] Movies rated >=4 by user {user_id}: {[movie.movie_id for movie in user_movies]}")
+    # The genres preferred by the current user come from their stored profile
+    user_genres = set(get_genre_profiles([user_id])[user_id])
+    logging.debug(f"Preferred genres for user {user_id}: {sorted(user_genres)}")
 
-    user_genres = set()
-    for movie in user_movies:
-        # Calculate similarity metrics
-        details = get_movie_details(movie.movie_id)
-        user_genres.update(details.get('genre_ids', []))
+    # Score every neighbour against the user in one vectorized pass over the rating matrix
+    engine = get_engine()
+    similarities = engine.similarity(user_id, similar_users)
+    genre_similarities = get_genre_similarities(user_id, similar_users)
+    neighbours = {}
 
     for similar_user in similar_users:
-        similarity_score = calculate_similarity(user_id, similar_user)
-        genre_similarity = get_genre_similarity(user_id, similar_user)
-        print(f"[DEBUG] Similarity score for user {similar_user}: {similarity_score}, Genre similarity: {genre_similarity}")
+        similarity_score = similarities[similar_user]
+        genre_similarity = genre_similarities[similar_user]
+        logging.debug(f"Similarity score for user {similar_user}: {similarity_score}, Genre similarity: {genre_similarity}")
         # Process recommendations only if similarity conditions are met
         if similarity_score > 0.4 or genre_similarity > 0.1:
-            similar_user_ratings = {
-                review.movie_id: {'rating': review.rating, 'timestamp': review.created_at}
-                for review in Review.query.filter_by(user_id=similar_user).filter(Review.rating >= 4).all()
-            }
-
-            for movie_id, details in similar_user_ratings.items():
-                if movie_id not in [r.movie_id for r in Review.query.filter_by(user_id=user_id).all()]:
-                    movie = get_movie_details(movie_id)
-                    if movie:
-                        print(f"[DEBUG] Adding collaborative recommendation: {movie['title']}")
-                        # Check if the movie's genres align with the user's preferred genres
-                        if set(movie['genre_ids']).intersection(user_genres):
-                            recommendations.append(movie)
-                            
-    print(f"[DEBUG] Final collaborative recommendations for user {user_id}: {[movie['title'] for movie in recommendations]}")
+            neighbours[similar_user] = similarity_score
+
+    # Movies rated >= 4 by a neighbour and unseen by the user, best weighted score first
+    candidate_ids = [movie_id for movie_id, score in engine.score_items(user_id, neighbours, min_rating=4)]
+
+    # Fetch every candidate in one batch
+    for movie in get_movie_details_many(candidate_ids):
+        if movie:
+            logging.debug(f"Adding collaborative recommendation: {movie['title']}")
+            # Check if the movie's genres align with the user's preferred genres
+            if set(movie['genre_ids']).intersection(user_genres):
+                recommendations.append(movie)
+
+    logging.debug(f"Final collaborative recommendations for user {user_id}: {[movie['title'] for movie in recommendations]}")
     return recommendations
 
+# Recent highly rated movies whose precomputed neighbours seed item-based recommendations
+ITEM_SEED_COUNT = 10
+ITEM_RECOMMENDATIONS_LIMIT = 20
+
+def get_factor_recommendations(user_id, limit=ITEM_RECOMMENDATIONS_LIMIT):
+    """Recommendations from the offline matrix factorization model; [] until a model has been trained."""
+    movie_ids = recommend_for_user(user_id, n=limit)
+    logging.debug(f"Factor model recommendations for user {user_id}: {movie_ids}")
+    return [movie for movie in get_movie_details_many(movie_ids) if movie]
+
+def get_item_neighbor_recommendations(user_id, limit=ITEM_RECOMMENDATIONS_LIMIT):
+    """
+    Item-based recommendations read from the item_neighbors table: neighbours of the user's recent
+    movies rated >= 4, summed over seeds, excluding anything the user already rated.
+    """
+    seeds = [
+        review.movie_id for review in Review.query.filter(
+            Review.user_id == user_id,
+            Review.rating >= 4
+        ).order_by(Review.created_at.desc()).limit(ITEM_SEED_COUNT).all()
+    ]
+    if not seeds:
+        return []
+
+    rated = db.session.query(Review.movie_id).filter(Review.user_id == user_id)
+    score = func.sum(ItemNeighbor.score).label('score')
+    rows = db.session.query(ItemNeighbor.neighbor_id, score).filter(
+        ItemNeighbor.movie_id.in_(seeds),
+        ItemNeighbor.neighbor_id.not_in(rated)
+    ).group_by(ItemNeighbor.neighbor_id).order_by(score.desc(), ItemNeighbor.neighbor_id).limit(limit).all()
+    logging.debug(f"Precomputed item neighbours for user {user_id}: {[row.neighbor_id for row in rows]}")
+
+    return [movie for movie in get_movie_details_many([row.neighbor_id for row in rows]) if movie]
+
 # Function to fetch similar movies for a given movie
 def get_similar_movies_for_details(movie_id):
-    """Fetches movies similar to a specific movie for the movie details page."""
-    recommendations_url = f'{TMDB_BASE_URL}/movie/{movie_id}/recommendations'
-    params = {
-        'api_key': API_KEY,
-        'language': 'en-US',
-        'page': 1
-    }
-    response = requests.get(recommendations_url, params=params)
-    return process_movie_results(response)
+    """
+    Fetches movies similar to a specific movie for the movie details page: nearest neighbours
+    of its latent vector from the local ANN index, or TMDB recommendations if it isn't indexed.
+    """
+    similar_ids = similar_movie_ids(movie_id, k=20)
+    if similar_ids:
+        similar_movies = [movie for movie in get_movie_details_many(similar_ids) if movie]
+        if similar_movies:
+            return similar_movies
+
+    return get_movie_recommendations(movie_id)
 
 # Function to generate general recommendations
 def get_recommended_movies(user=None):
@@ -158,58 +264,89 @@ def get_recommended_movies(user=None):
                                                       .order_by(UserMovies.id.desc()).first()
         
         if last_movie:
-            movie = get_movie_details(last_movie.movie_id)
-            if movie:
-                recommendations = get_movie_recommendations(movie['title'])
-                if recommendations:
-                    return recommendations
-                else:
-                    print("No recommendations returned for:", movie['title'])
+            recommendations = get_movie_recommendations(last_movie.movie_id)
+            if recommendations:
+                return recommendations
             else:
-                print("Movie details not found for movie ID:", last_movie.movie_id)
+                logging.info(f"No recommendations returned for movie ID {last_movie.movie_id}")
+
+    # Default to trending movies if no user or no specific genres in watchlist/favorites;
+    # the cached list the warmer keeps fresh, so the home page never waits on TMDB for it
+    return get_trending_movies()
 
-    # Default to trending movies if no user or no specific genres in watchlist/favorites
-    url = f'{TMDB_BASE_URL}/trending/movie/week'
+
+# TMDB recommendations per movie ID are refreshed in the background after an hour and dropped after a day
+RECOMMENDATIONS_SOFT_TIMEOUT = 3600
+RECOMMENDATIONS_HARD_TIMEOUT = 86400
+# Bounded pool for fetching several movies' recommendations at once
+RECOMMENDATIONS_MAX_WORKERS = int(os.environ.get('RECOMMENDATIONS_MAX_WORKERS', 4))
+recommendations_executor = ThreadPoolExecutor(max_workers=RECOMMENDATIONS_MAX_WORKERS, thread_name_prefix='movie-recommendations')
+
+def get_movie_recommendations(movie_id):
+    """
+    Fetch content-based recommendations for a specific movie from TMDB, cached per movie ID.
+    One request to /movie/{id}/recommendations; stale entries are served while a background refresh runs.
+    """
+    cache_key = f"movie_recommendations_{movie_id}"
+    recommendations = get_or_fetch(cache_key, partial(_load_movie_recommendations, movie_id),
+                                   RECOMMENDATIONS_SOFT_TIMEOUT, RECOMMENDATIONS_HARD_TIMEOUT)
+    return recommendations or []
+
+def _load_movie_recommendations(movie_id):
     params = {
-        'api_key': API_KEY,
         'language': 'en-US',
         'page': 1
     }
-    response = requests.get(url, params=params)
+    response = tmdb.get(f'/movie/{movie_id}/recommendations', params=params)
+    if response is not None and response.status_code == 404:
+        return Negative([], MISSING_MOVIE_TIMEOUT)
+    if response is None or response.status_code != 200:
+        return None  # TMDB could not answer; nothing is cached so the next read retries
     return process_movie_results(response)
 
-
-def get_movie_recommendations(movie_title):
+def get_content_recommendations(movie_ids):
     """
-    Fetch content-based recommendations for a specific movie using TMDB API with caching.
+    Fetch recommendations for several movies concurrently and merge them in seed order,
+    keeping the first occurrence of each movie.
     """
-    cache_key = f"movie_recommendations_{movie_title}"
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if len(movie_ids) <= 1:
+        results = [get_movie_recommendations(movie_id) for movie_id in movie_ids]
+    else:
+        results = recommendations_executor.map(with_app_context(get_movie_recommendations), movie_ids)
+
+    merged = {}
+    for recommendations in results:
+        for movie in recommendations:
+            merged.setdefault(movie['id'], movie)
+    return list(merged.values())
+
+# Function to fetch personalized recommendations
+# Personalized recommendations are cached per user until one of their events invalidates them;
+# the timeout bounds staleness from other users' ratings feeding the collaborative part
+PERSONALIZED_TIMEOUT = 3600
+
+def personalized_cache_key(user_id):
+    return f"personalized_recommendations_{user_id}"
+
+def get_cached_personalized_recommendations(user):
+    """Returns the user's personalized recommendations, computing them only on a cache miss."""
+    if not user or not user.is_authenticated:
+        return []
+
+    cache_key = personalized_cache_key(user.id)
     recommendations = cache.get(cache_key)
+    if recommendations is None:
+        recommendations = get_personalized_recommendations(user)
+        cache.set(cache_key, recommendations, timeout=PERSONALIZED_TIMEOUT)
+    else:
+        logging.debug(f"Serving cached personalized recommendations for user {user.id}")
+    return recommendations
 
-    if not recommendations:
-        search_url = f"{TMDB_BASE_URL}/search/movie"
-        search_params = {
-            'api_key': API_KEY,
-            'query': movie_title,
-            'language': 'en-US',
-            'page': 1
-        }
-    search_response = requests.get(search_url, params=search_params)
-    if search_response.status_code == 200:
-        search_results = search_response.json().get('results', [])
-        if search_results:
-            movie_id = search_results[0]['id']
-            recommendations_url = f'{TMDB_BASE_URL}/movie/{movie_id}/recommendations'
-            rec_params = {
-                'api_key': API_KEY,
-                'language': 'en-US',
-                'page': 1
-            }
-            rec_response = requests.get(recommendations_url, params=rec_params)
-            return process_movie_results(rec_response)
-    return []
+def invalidate_personalized_recommendations(user_id):
+    """Drops the cached recommendations after the user rates, reviews or lists a movie."""
+    cache.delete(personalized_cache_key(user_id))
 
-# Function to fetch personalized recommendations
 def get_personalized_recommendations(user):
     """
     Generate personalized recommendations for a user based on:
@@ -224,7 +361,7 @@ def get_personalized_recommendations(user):
     content_recommendations = []
 
     # Debugging the personalized recommendations
-    print("Fetching content-based recommendations for user:", user.id)
+    logging.debug(f"Fetching content-based recommendations for user {user.id}")
 
     # Fetch the last 2 movies rated >5 by the user
     recent_reviews = Review.query.filter(
@@ -232,15 +369,17 @@ def get_personalized_recommendations(user):
         Review.rating > 5
     ).order_by(Review.created_at.desc()).limit(2).all()
 
-    # Get content-based recommendations for these movies
-    for review in recent_reviews:
-        similar_movies = get_movie_recommendations(get_movie_details(review.movie_id).get('title'))
-        for movie in similar_movies:
-            movie['type'] = 'content'  # Mark as content-based
-            content_recommendations.append(movie)
-
-    # Get collaborative filtering recommendations
-    collaborative_recs = get_collaborative_recommendations(user.id)
+    # Get content-based recommendations for these movies (fetched concurrently, keyed by movie ID)
+    for movie in get_content_recommendations([review.movie_id for review in recent_reviews]):
+        content_recommendations.append(dict(movie, type='content'))  # Mark as content-based
+
+    # Get collaborative filtering recommendations: the latent factor model first, then precomputed
+    # item neighbours, and similar users only when neither offline model covers this user yet
+    collaborative_recs = (
+        get_factor_recommendations(user.id)
+        or get_item_neighbor_recommendations(user.id)
+        or get_collaborative_recommendations(user.id)
+    )
     for movie in collaborative_recs:
         movie['type'] = 'collaborative'  # Mark as collaborative
         recommendations.append(movie)
@@ -256,7 +395,7 @@ def get_personalized_recommendations(user):
 # Function to process raw API results
 def process_movie_results(response):
     """Processes movie results from TMDB API responses to include images and ratings."""
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         results = response.json().get('results', [])
         for movie in results:
             movie['rating'] = movie.get('vote_average', 'N/A')
@@ -2,10 +2,11 @@ import unittest
 from unittest.mock import patch, MagicMock
 from flask import Flask
 from models import db, Review, UserMovies
+from tmdb_client import tmdb
+from extensions import cache
 from recommendation import (
     get_personalized_recommendations,
     get_collaborative_recommendations,
-    get_similar_users,
     calculate_similarity,
     get_genre_similarity,
     get_similar_movies_for_details,
@@ -18,6 +19,7 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
 
 
 class TestRecommendation(unittest.TestCase):
@@ -43,14 +45,16 @@ class TestRecommendation(unittest.TestCase):
         """Set up the app context for each individual test."""
         self.app_context = app.app_context()
         self.app_context.push()
+        tmdb.breaker.reset()
+        cache.clear()
 
     def tearDown(self):
         """Pop the app context after each test."""
         self.app_context.pop()
 
-    @patch('recommendation.get_movie_details')
+    @patch('recommendation.get_movie_details_many')
     @patch('recommendation.get_similar_users')
-    def test_collaborative_recommendations(self, mock_get_similar_users, mock_get_movie_details):
+    def test_collaborative_recommendations(self, mock_get_similar_users, mock_get_movie_details_many):
         print("Setting up mocks for collaborative recommendations...")
 
         # Mock similar users for collaborative filtering
@@ -58,11 +62,11 @@ class TestRecommendation(unittest.TestCase):
         print("Mock similar users created for collaborative filtering.")
 
         # Mock movie details for the recommended movies from similar users
-        mock_get_movie_details.side_effect = lambda movie_id: {
+        mock_get_movie_details_many.side_effect = lambda movie_ids: [{
             'id': movie_id,
             'title': f'Movie Title {movie_id}',
             'genre_ids': [1, 2]
-        }
+        } for movie_id in movie_ids]
         print("Mock movie details are set for collaborative filtering.")
 
         # Perform the collaborative recommendation test
@@ -76,8 +80,9 @@ class TestRecommendation(unittest.TestCase):
         self.assertGreater(len(recommendations), 0, "No collaborative recommendations were generated.")
 
     @patch('recommendation.get_movie_recommendations')
+    @patch('recommendation.get_movie_details_many')
     @patch('recommendation.get_movie_details')
-    def test_content_based_recommendations(self, mock_get_movie_details, mock_get_movie_recommendations):
+    def test_content_based_recommendations(self, mock_get_movie_details, mock_get_movie_details_many, mock_get_movie_recommendations):
         print("Setting up mocks for content-based recommendations...")
 
         # Mock movie details for the user's recently rated movies
@@ -86,9 +91,10 @@ class TestRecommendation(unittest.TestCase):
             'title': f'Movie Title {movie_id}',
             'genre_ids': [1, 2]
         }
+        mock_get_movie_details_many.side_effect = lambda movie_ids: [mock_get_movie_details(movie_id) for movie_id in movie_ids]
         print("Mock movie details are set.")
 
-        # Mock TMDB recommendations based on these movies
+        # Mock TMDB recommendations based on these movies (looked up by movie ID, no title search)
         mock_get_movie_recommendations.side_effect = [
             [{'id': 201, 'title': 'Recommended Movie 1', 'type': 'content'}, {'id': 202, 'title': 'Recommended Movie 2', 'type': 'content'}]
         ]
@@ -104,6 +110,7 @@ class TestRecommendation(unittest.TestCase):
         # Assert that recommendations are returned and are correctly marked as 'content'
         self.assertGreater(len(recommendations), 0, "No content-based recommendations were generated.")
         self.assertTrue(all(rec['type'] == 'content' for rec in recommendations))
+        mock_get_movie_recommendations.assert_called_once_with(101)
 
     @patch('recommendation.Review.query.filter')
     def test_calculate_similarity(self, mock_filter):
@@ -119,9 +126,9 @@ class TestRecommendation(unittest.TestCase):
 
         self.assertGreaterEqual(similarity_score, 0, "Similarity score calculation failed.")
 
-    @patch('recommendation.get_movie_details')
+    @patch('recommendation.get_movie_details_many')
     @patch('recommendation.Review.query.filter')
-    def test_get_genre_similarity(self, mock_filter, mock_get_movie_details):
+    def test_get_genre_similarity(self, mock_filter, mock_get_movie_details_many):
         print("Setting up mock for get_genre_similarity...")
 
         # Mock reviews
@@ -130,17 +137,17 @@ class TestRecommendation(unittest.TestCase):
         mock_filter.side_effect = [[mock_user_review], [mock_other_user_review]]
 
         # Mock movie details to include genres
-        mock_get_movie_details.side_effect = lambda movie_id: {
+        mock_get_movie_details_many.side_effect = lambda movie_ids: [{
             'id': movie_id,
             'genre_ids': [1, 2]
-        }
+        } for movie_id in movie_ids]
 
         genre_similarity = get_genre_similarity(1, 2)
         print(f"Genre similarity: {genre_similarity}")
 
         self.assertGreaterEqual(genre_similarity, 0, "Genre similarity calculation failed.")
 
-    @patch('requests.get')
+    @patch('tmdb_client.tmdb.session.get')
     def test_get_similar_movies_for_details(self, mock_get):
         print("Setting up mock for get_similar_movies_for_details...")
 
@@ -157,7 +164,7 @@ class TestRecommendation(unittest.TestCase):
 
         self.assertGreater(len(recommendations), 0, "No similar movies found.")
 
-    @patch('requests.get')
+    @patch('tmdb_client.tmdb.session.get')
     def test_get_recommended_movies(self, mock_get):
         print("Setting up mock for get_recommended_movies...")
 
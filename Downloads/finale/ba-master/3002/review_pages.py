@@ -0,0 +1,45 @@
+# review_pages.py
+
+import os
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+from models import Review
+
+# Reviews per page on the movie details page and per "load more" request
+REVIEWS_PAGE_SIZE = int(os.environ.get('REVIEWS_PAGE_SIZE', 20))
+REVIEWS_MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(review):
+    """An opaque position after `review` in newest-first order: its (created_at, id)."""
+    return f"{review.created_at.isoformat()}_{review.id}"
+
+
+def decode_cursor(cursor):
+    """Parses a cursor from encode_cursor; raises ValueError for anything else."""
+    created_at, _, review_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created_at), int(review_id)
+
+
+def get_review_page(movie_id, cursor=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    Returns (reviews, next_cursor) for a movie, newest first, with each review's user loaded in the
+    same query. Pages continue from `cursor` with a keyset on (created_at, id), which the
+    (movie_id, created_at, id) index serves without scanning earlier pages; next_cursor is None on
+    the last page.
+    """
+    query = Review.query.options(joinedload(Review.user)).filter(Review.movie_id == movie_id)
+    if cursor:
+        created_at, review_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Review.created_at < created_at,
+            and_(Review.created_at == created_at, Review.id < review_id)
+        ))
+
+    # One extra row tells whether another page follows
+    reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1).all()
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        return reviews, encode_cursor(reviews[-1])
+    return reviews, None
@@ -0,0 +1,368 @@
+# routes.py
+
+from flask import Blueprint, abort, current_app, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required, current_user
+from models import db, UserMovies
+from recommendation import get_recommended_movies, get_cached_personalized_recommendations, invalidate_personalized_recommendations, get_similar_movies_for_details
+from utils import get_movie_details, get_movie_details_many, get_similar_movie_ratings
+from rating_stats import avg_ratings, NO_RATINGS
+from writes import save_rating, add_to_list
+from review_pages import get_review_page, REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE
+from tmdb_helpers import get_top_rated_movies, get_new_released_movies, get_trending_movies, get_genres, get_languages, search_movie
+from mf_model import fold_in_user
+from tmdb_client import tmdb
+from fanout import fetch_concurrently
+from functools import partial
+from datetime import datetime
+
+# Every page of the site; registered on each app by create_app() in app.py
+main = Blueprint('main', __name__)
+
+# --------------------- Helper Functions ---------------------
+
+def get_home_page_tasks():
+    """Builds the independent TMDB fetches shared by the index and /recommend pages."""
+    # Resolve the user on the request thread; worker threads only get an app context
+    user = current_user._get_current_object() if current_user.is_authenticated else None
+    return {
+        'recommendations': partial(get_recommended_movies, user),
+        'genres': get_genres,
+        'languages': get_languages,
+        'trending_movies': get_trending_movies,
+        'most_watched_movies': get_top_rated_movies,
+        'new_released_movies': get_new_released_movies
+    }
+
+def get_years():
+    """Generates a list of years from 1900 to the current year."""
+    current_year = datetime.now().year
+    return list(range(current_year, 1899, -1))  # From current year down to 1900
+
+# --------------------- Autocomplete Route ---------------------
+
+@main.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify([])
+
+    # Fetch search results using the existing search_movie function
+    search_results = search_movie(query)
+    
+    # Create suggestions for autocomplete
+    suggestions = [{'label': movie['title'], 'value': movie['title'], 'id': movie['id']} for movie in search_results[:10]]
+    return jsonify(suggestions)
+
+# --------------------- TMDB Client Stats Route ---------------------
+
+@main.route('/tmdb/stats', methods=['GET'])
+def tmdb_stats():
+    """Exposes per-endpoint TMDB request, throttle and error counters; only in debug or testing, never in production."""
+    if not (current_app.debug or current_app.testing):
+        abort(404)
+    return jsonify(tmdb.stats())
+
+# --------------------- Movie Details Routes ---------------------
+
+# Route to submit a rating for a movie
+@main.route('/rate_movie', methods=['POST'])
+@login_required
+def rate_movie():
+    movie_id = request.json.get('movie_id')
+    rating = request.json.get('rating')
+    
+    if not movie_id or not rating:
+        return jsonify({"message": "Invalid data"}), 400
+
+    try:
+        rating_value = float(rating)
+        if not (0 <= rating_value <= 5):
+            return jsonify({"message": "Rating must be between 0 and 5"}), 400
+
+        # Insert or update the user's rating (and the stats and genre profile) in one transaction
+        save_rating(current_user.id, int(movie_id), rating_value)
+        fold_in_user(current_user.id)
+        invalidate_personalized_recommendations(current_user.id)
+        return jsonify({"message": "Rating submitted successfully!"}), 200
+    except ValueError:
+        return jsonify({"message": "Invalid rating value"}), 400
+
+@main.route('/movie/<int:movie_id>', methods=['GET', 'POST'])
+def movie_details(movie_id):
+    movie = get_movie_details(movie_id)
+    if not movie:
+        abort(404)
+
+    # First page of reviews (users joined in); the rest come from movie_reviews on demand
+    reviews, next_cursor = get_review_page(movie_id)
+
+    # Fetch similar movies specifically for the movie details page
+    similar_movies = get_similar_movies_for_details(movie_id) or []
+
+    # Averages for this movie and every similar movie come from one summary-table query
+    averages = avg_ratings([movie_id] + [similar['id'] for similar in similar_movies])
+    avg_rating = averages.get(movie_id, NO_RATINGS)
+    recommendations = get_similar_movie_ratings(similar_movies, averages)
+
+    # Handle rating submission if user is authenticated and submits a review
+    if request.method == 'POST' and current_user.is_authenticated:
+        rating = request.form.get('rating')
+        review_text = request.form.get('review_text')
+
+        if rating:
+            try:
+                rating_value = float(rating)
+                if 0 <= rating_value <= 10:
+                    save_rating(current_user.id, movie_id, rating_value, review_text=review_text)
+                    fold_in_user(current_user.id)
+                    invalidate_personalized_recommendations(current_user.id)
+                    flash("Review submitted successfully!", "success")
+                else:
+                    flash("Rating must be between 0 and 10.", "warning")
+            except ValueError:
+                flash("Invalid rating value.", "danger")
+            return redirect(url_for('main.movie_details', movie_id=movie_id))
+        else:
+            flash("Please provide a rating.", "warning")
+
+    return render_template('movie_details.html', movie=movie, reviews=reviews, next_cursor=next_cursor,
+                           avg_rating=avg_rating, recommendations=recommendations)
+
+# "Load more" for the reviews on the movie details page
+@main.route('/movie/<int:movie_id>/reviews', methods=['GET'])
+def movie_reviews(movie_id):
+    limit = min(request.args.get('limit', REVIEWS_PAGE_SIZE, type=int), REVIEWS_MAX_PAGE_SIZE)
+    try:
+        reviews, next_cursor = get_review_page(movie_id, request.args.get('cursor'), max(limit, 1))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    return jsonify({'reviews': [review.to_dict() for review in reviews], 'next_cursor': next_cursor})
+
+# Route to submit a rating for a similar movie (does not affect main feedback)
+@main.route('/rate_similar_movie', methods=['POST'])
+@login_required
+def rate_similar_movie():
+    movie_id = request.json.get('movie_id')
+    rating = request.json.get('rating')
+
+    if not movie_id or not rating:
+        return jsonify({"message": "Invalid data"}), 400
+
+    try:
+        rating_value = float(rating)
+        if not (0 <= rating_value <= 5):
+            return jsonify({"message": "Rating must be between 0 and 5"}), 400
+
+        # Here you can choose not to store the similar movie rating in the main feedback system
+        # If you want to track similar movie ratings separately, you could add logic here for tracking
+
+        return jsonify({"message": "Rating for similar movie submitted successfully!"}), 200
+    except ValueError:
+        return jsonify({"message": "Invalid rating value"}), 400
+
+# --------------------- Watchlist and Favorites Routes ---------------------
+
+# Route to add a movie to Watchlist or Favorites
+@main.route('/<category>/add/<int:movie_id>', methods=['POST'])
+@login_required
+def add_movie(category, movie_id):
+    if category not in ['watchlist', 'favorites']:
+        flash("Invalid category.", "danger")
+        return redirect(url_for('main.index'))
+
+    try:
+        if add_to_list(current_user.id, movie_id, category):
+            invalidate_personalized_recommendations(current_user.id)
+            flash(f"Movie added to {category}.", "success")
+        else:
+            flash("Movie is already in your list.", "info")
+    except Exception as e:
+        flash(f"Error adding movie to {category}: {str(e)}", "danger")
+
+    return redirect(url_for(f'main.view_{category}'))
+
+# Route to remove a movie from Watchlist or Favorites
+@main.route('/<category>/remove/<int:movie_id>', methods=['POST'])
+@login_required
+def remove_movie(category, movie_id):
+    if category not in ['watchlist', 'favorites']:
+        flash("Invalid category.", "danger")
+        return redirect(url_for('main.index'))
+    
+    entry = UserMovies.query.filter_by(user_id=current_user.id, movie_id=movie_id, category=category).first()
+    if entry:
+        try:
+            db.session.delete(entry)
+            db.session.commit()
+            invalidate_personalized_recommendations(current_user.id)
+            flash(f"Movie removed from {category}.", "success")
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error removing movie from {category}: {str(e)}", "danger")
+    else:
+        flash("Movie not found in your list.", "warning")
+    
+    return redirect(url_for(f'main.view_{category}'))
+
+# Route to view Watchlist
+@main.route('/watchlist')
+@login_required
+def view_watchlist():
+    watchlist_movies = UserMovies.query.filter_by(user_id=current_user.id, category='watchlist').all()
+    movies = [movie for movie in get_movie_details_many([entry.movie_id for entry in watchlist_movies]) if movie]
+    if not movies:
+        flash("Your watchlist is empty.", "info")
+    return render_template('watchlist.html', movies=movies, category="Watchlist")
+
+# Route to view Favorites
+@main.route('/favorites')
+@login_required
+def view_favorites():
+    favorite_movies = UserMovies.query.filter_by(user_id=current_user.id, category='favorites').all()
+    movies = [movie for movie in get_movie_details_many([entry.movie_id for entry in favorite_movies]) if movie]
+    if not movies:
+        flash("Your favorites list is empty.", "info")
+    return render_template('favorites.html', movies=movies, category="Favorites")
+
+# --------------------- Filter Watchlist and Favorites Routes ---------------------
+
+@main.route('/filters.html')
+def filters():
+    return render_template('filters.html')
+
+@main.route('/filter_watchlist', methods=['GET'])
+@login_required
+def filter_watchlist():
+    sortby = request.args.get('sortby')
+    movies = get_filtered_watchlist(current_user.id, sortby)
+    return render_template('watchlist.html', movies=movies, category="Watchlist")
+
+@main.route('/filter_favorites', methods=['GET'])
+@login_required
+def filter_favorites():
+    sortby = request.args.get('sortby')
+    movies = get_filtered_watchlist(current_user.id, sortby, category='favorites')
+    return render_template('favorites.html', movies=movies, category="Favorites")
+
+# Helper function to get filtered watchlist or favorites
+def get_filtered_watchlist(user_id, sortby, category='watchlist'):
+    user_movies = UserMovies.query.filter_by(user_id=user_id, category=category).all()
+    movies = [movie for movie in get_movie_details_many([entry.movie_id for entry in user_movies]) if movie]
+    
+    # Apply sorting based on sortby parameter
+    if sortby:
+        if sortby == 'rating_desc':
+            movies.sort(key=lambda x: x.get('rating', 0), reverse=True)
+        elif sortby == 'rating_asc':
+            movies.sort(key=lambda x: x.get('rating', 0))
+        elif sortby == 'release_date_desc':
+            movies.sort(key=lambda x: x.get('release_date', ''), reverse=True)
+        elif sortby == 'release_date_asc':
+            movies.sort(key=lambda x: x.get('release_date', ''))
+        elif sortby == 'title_asc':
+            movies.sort(key=lambda x: x.get('title', '').lower())
+        elif sortby == 'title_desc':
+            movies.sort(key=lambda x: x.get('title', '').lower(), reverse=True)
+    
+    return movies
+
+# --------------------- Top-Rated, New Released, Trending Routes ---------------------
+
+# Route to display top-rated movies
+@main.route('/top-rated')
+def top_rated():
+    top_rated_movies = get_top_rated_movies()
+    genres = get_genres()
+    languages = get_languages()  # Fetch languages
+    years = get_years()  # Fetch years list
+    return render_template('top_rated.html', top_rated_movies=top_rated_movies, genres=genres, languages=languages, years=years)
+
+# Route to display newly released movies
+@main.route('/new-released')
+def new_released():
+    new_released_movies = get_new_released_movies()
+    genres = get_genres()
+    languages = get_languages()  # Fetch languages
+    years = get_years()  # Fetch years list
+    return render_template('new_released.html', new_released_movies=new_released_movies, genres=genres, languages=languages, years=years)
+
+# Route to display trending movies
+@main.route('/trending')
+def trending():
+    trending_movies = get_trending_movies()
+    genres = get_genres()
+    languages = get_languages()  # Fetch languages
+    years = get_years()  # Fetch years list
+    return render_template('trending.html', trending_movies=trending_movies, genres=genres, languages=languages, years=years)
+
+# --------------------- Recommendation Routes ---------------------
+
+@main.route('/personalized')
+@login_required
+def personalized_recommendations():
+    # Fetch personalized recommendations
+    personalized_recs = get_cached_personalized_recommendations(current_user)
+
+    # Separate recommendations into content-based and collaborative filtering
+    content_recommendations = [rec for rec in personalized_recs if rec.get('type') == 'content']
+    collaborative_recommendations = [rec for rec in personalized_recs if rec.get('type') == 'collaborative']
+
+    return render_template(
+        'personalized.html',
+        content_recommendations=content_recommendations,
+        collaborative_recommendations=collaborative_recommendations
+    )
+
+@main.route('/recommend', methods=['POST'])
+def recommend():
+    movie_title = request.form.get('movie_title', '').strip()
+    release_year = request.form.get('release_year', '').strip()
+    rating = request.form.get('rating', '').strip()
+    genre = request.form.get('genre', '').strip()
+    language = request.form.get('language', '').strip()
+    sort_by = request.form.get('sort_by', '').strip()
+
+    filters = {
+        'release_year': release_year,
+        'rating': rating,
+        'genre': genre,
+        'language': language,
+        'sort_by': sort_by
+    }
+
+    years = get_years()  # Fetch years list
+
+    # Perform the search and fetch every page section concurrently
+    data = fetch_concurrently({
+        'search_results': partial(search_movie, movie_title, filters=filters),
+        **get_home_page_tasks()
+    })
+
+    return render_template(
+        'index.html',
+        search_results=data['search_results'],
+        recommendations=data['recommendations'],
+        search_query=movie_title,
+        filters=filters,
+        genres=data['genres'],
+        languages=data['languages'],
+        years=years,
+        trending_movies=data['trending_movies'],
+        most_watched_movies=data['most_watched_movies'],
+        new_released_movies=data['new_released_movies']
+    )
+
+@main.route('/')
+def index():
+    years = get_years()  # Fetch years list
+    data = fetch_concurrently(get_home_page_tasks())
+    return render_template(
+        'index.html',
+        recommendations=data['recommendations'],
+        genres=data['genres'],
+        languages=data['languages'],
+        years=years,
+        trending_movies=data['trending_movies'],
+        most_watched_movies=data['most_watched_movies'],
+        new_released_movies=data['new_released_movies']
+    )
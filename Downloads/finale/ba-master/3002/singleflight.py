@@ -0,0 +1,60 @@
+# singleflight.py
+
+import copy
+import threading
+
+
+class _Call:
+    """A fetch that is currently in flight, shared by everyone waiting on the same key."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key across threads.
+
+    The first caller for a key runs the fetch; callers that arrive while it is
+    still running wait for it and receive a copy of its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            # Each request gets its own copy, just as it would from the cache
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self, key):
+        """Returns True while a fetch for `key` is running."""
+        with self._lock:
+            return key in self._calls
+
+
+# Shared coalescing layer for TMDB-backed cache fills, keyed by cache key
+inflight = SingleFlight()
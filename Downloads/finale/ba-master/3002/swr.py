@@ -0,0 +1,114 @@
+# swr.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from extensions import cache
+from fanout import with_app_context
+from singleflight import inflight
+
+# Background refreshes run on their own small pool so they never compete with page fan-out
+refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='swr-refresh')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class Uncacheable:
+    """Wraps a loader result that should be returned to the caller but not stored (e.g. partial results)."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Negative:
+    """
+    Wraps an authoritative "nothing here" answer (a TMDB 404, an empty search) that is
+    cached for a short `timeout` instead of the usual soft/hard windows.
+    """
+
+    def __init__(self, value, timeout):
+        self.value = value
+        self.timeout = timeout
+
+
+def store(key, value, soft_timeout, hard_timeout):
+    """Writes a value with its soft expiry; the entry is dropped after `hard_timeout`."""
+    entry = {'value': value, 'soft_expiry': time.time() + soft_timeout}
+    cache.set(key, entry, timeout=hard_timeout)
+
+
+def _load(key, loader, soft_timeout, hard_timeout):
+    """Calls the loader and stores its result; None means TMDB could not answer and nothing is stored."""
+    value = loader()
+    if isinstance(value, Uncacheable):
+        return value.value
+    if isinstance(value, Negative):
+        # Soft and hard expiry coincide so the entry simply lapses instead of being refreshed
+        store(key, value.value, value.timeout, value.timeout)
+        return value.value
+    if value is not None:
+        store(key, value, soft_timeout, hard_timeout)
+    return value
+
+
+def reload(key, loader, soft_timeout, hard_timeout):
+    """Runs the loader now and stores its result, returning the new value (None if TMDB could not answer)."""
+    return _load(key, loader, soft_timeout, hard_timeout)
+
+
+def expires_within(key, seconds):
+    """Returns True if the entry is missing or will pass its soft TTL within `seconds`."""
+    entry = cache.get(key)
+    return entry is None or entry['soft_expiry'] - time.time() <= seconds
+
+
+def _refresh(key, loader, soft_timeout, hard_timeout):
+    try:
+        if _load(key, loader, soft_timeout, hard_timeout) is None:
+            logging.info(f"Refresh of {key} failed, still serving the stale entry")
+    except Exception as e:
+        logging.error(f"Background refresh of {key} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def refresh_in_background(key, loader, soft_timeout, hard_timeout):
+    """Schedules a single background refresh per key."""
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    refresh_executor.submit(with_app_context(_refresh), key, loader, soft_timeout, hard_timeout)
+
+
+def serve(key, entry, loader, soft_timeout, hard_timeout):
+    """Returns the value of a cached entry, refreshing it in the background once it is past its soft TTL."""
+    if time.time() >= entry['soft_expiry']:
+        refresh_in_background(key, loader, soft_timeout, hard_timeout)
+    return entry['value']
+
+
+def get_or_fetch(key, loader, soft_timeout, hard_timeout):
+    """
+    Stale-while-revalidate cache read.
+
+    Fresh entries are returned as-is. Entries past `soft_timeout` are still returned
+    immediately while one background refresh replaces them; entries disappear after
+    `hard_timeout`. On a cold miss the loader runs once per key (concurrent callers share
+    the result). The loader returns the value to cache, a Negative (short-lived empty answer),
+    an Uncacheable, or None on failure.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        return serve(key, entry, loader, soft_timeout, hard_timeout)
+
+    def fill():
+        # Another request may have filled the cache while we were queued
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+        return _load(key, loader, soft_timeout, hard_timeout)
+
+    return inflight.do(key, fill)
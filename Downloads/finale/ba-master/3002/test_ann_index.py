@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from ann_index import AnnIndex, save_index, get_index
+
+
+def clustered_vectors(n=5000, dims=32, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dims))
+    return rng.permutation(n) + 1000, vectors.astype(np.float32)
+
+
+class AnnIndexTestCase(unittest.TestCase):
+    """Test case for the random-projection LSH index."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.movie_ids, cls.vectors = clustered_vectors()
+        cls.index = AnnIndex.build(cls.movie_ids, cls.vectors)
+
+    def exact_neighbours(self, movie_id, k=20):
+        i = int(np.searchsorted(self.index.movie_ids, movie_id))
+        scores = self.index.vectors @ self.index.vectors[i]
+        scores[i] = -np.inf
+        return set(self.index.movie_ids[np.argsort(-scores)[:k]].tolist())
+
+    def test_recall_against_brute_force(self):
+        recall = [
+            len(self.exact_neighbours(movie_id) & {m for m, score in self.index.similar(movie_id)}) / 20
+            for movie_id in self.movie_ids[:50].tolist()
+        ]
+        self.assertGreater(np.mean(recall), 0.8)
+
+    def test_results_are_ranked_and_exclude_the_query(self):
+        movie_id = int(self.movie_ids[0])
+        results = self.index.similar(movie_id, k=20)
+        self.assertEqual(len(results), 20)
+        self.assertNotIn(movie_id, [m for m, score in results])
+        scores = [score for m, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertIsNone(self.index.similar(1))  # Not indexed: callers fall back to TMDB
+
+    def test_saved_index_is_memory_mapped_and_versioned(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.assertIsNone(get_index(root))
+            save_index(self.index, root)
+            loaded = get_index(root)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            movie_id = int(self.movie_ids[0])
+            self.assertEqual(loaded.similar(movie_id), self.index.similar(movie_id))
+
+            # Publishing a new version swaps readers over and prunes old versions
+            for _ in range(3):
+                save_index(self.index, root)
+            self.assertIsNot(get_index(root), loaded)
+            self.assertEqual(len([name for name in os.listdir(root) if name.isdigit()]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+from app import create_app
+from cf_engine import RatingMatrix, get_engine
+from config import TestingConfig
+from fixtures import AppTestCase, add_users
+from models import db, Review
+from writes import save_rating
+
+
+class RatingMatrixTestCase(unittest.TestCase):
+    """Test case for the sparse collaborative filtering engine."""
+
+    def setUp(self):
+        # user 1 and 2 agree, user 3 disagrees with user 1, user 4 shares a single movie
+        self.reviews = [
+            (1, 10, 5), (1, 11, 3), (1, 12, 1), (1, 13, 4),
+            (2, 10, 4.5), (2, 11, 3), (2, 12, 2), (2, 14, 5),
+            (3, 10, 1), (3, 11, 3), (3, 12, 5), (3, 15, 4),
+            (4, 10, 5), (4, 16, 0),
+        ]
+        self.engine = RatingMatrix(*zip(*self.reviews))
+
+    def pairwise_pearson(self, user, other):
+        """The original per-pair calculation: np.corrcoef over co-rated movies."""
+        mine = {movie: rating for u, movie, rating in self.reviews if u == user}
+        theirs = {movie: rating for u, movie, rating in self.reviews if u == other}
+        common = sorted(set(mine) & set(theirs))
+        if len(common) < 2:
+            return 0
+        similarity = np.corrcoef([mine[m] for m in common], [theirs[m] for m in common])[0, 1]
+        return 0 if np.isnan(similarity) else similarity
+
+    def test_pearson_matches_pairwise_calculation(self):
+        sims = self.engine.similarity(1, [2, 3, 4, 99])
+        for other in (2, 3, 4):
+            self.assertAlmostEqual(sims[other], self.pairwise_pearson(1, other))
+        self.assertEqual(sims[99], 0.0)
+        self.assertGreater(sims[2], 0.9)
+        self.assertLess(sims[3], -0.9)
+
+    def test_duplicate_reviews_keep_the_latest(self):
+        engine = RatingMatrix([1, 1, 2], [10, 10, 10], [1, 5, 5])
+        self.assertEqual(engine.R[engine.user_index[1]].toarray().ravel().tolist(), [5])
+
+    def assertSameRatings(self, engine, reviews):
+        """`engine` holds exactly `reviews` ((user, movie, rating), last one wins), with matching norms and similarities."""
+        expected = {(user, movie): rating for user, movie, rating in reviews}
+        fresh = RatingMatrix(*zip(*[(user, movie, rating) for (user, movie), rating in expected.items() if rating is not None]))
+        self.assertEqual(sorted(zip(*(values.tolist() for values in engine.triplets()))),
+                         sorted(zip(*(values.tolist() for values in fresh.triplets()))))
+        for user in fresh.user_index:
+            self.assertAlmostEqual(engine.norms[engine.user_index[user]], fresh.norms[fresh.user_index[user]])
+            others = list(fresh.user_index)
+            self.assertEqual(engine.similarity(user, others), fresh.similarity(user, others))
+
+    def test_changes_match_a_fresh_build(self):
+        changes = [(1, 10, 2), (5, 10, 4), (2, 14, None), (4, 16, None), (4, 16, 3), (5, 17, 1), (5, 17, None),
+                   (3, 9, 2), (6, 11, 5), (1, 12, None)]
+        changed = self.engine.apply_changes(changes, version=3)
+        self.assertEqual(changed.version, 3)
+        self.assertSameRatings(changed, self.reviews + changes)
+        self.assertSameRatings(self.engine, self.reviews)  # New entries never touch the old matrix
+
+    def test_rerating_updates_in_place(self):
+        changes = [(1, 10, 2), (2, 14, 1), (1, 10, 3)]
+        self.assertIs(self.engine.apply_changes(changes, version=2), self.engine)
+        self.assertEqual(self.engine.version, 2)
+        self.assertSameRatings(self.engine, self.reviews + changes)
+
+    def test_random_changes_match_a_fresh_build(self):
+        rng = np.random.default_rng(1)
+        reviews = list(zip(rng.integers(0, 30, 300).tolist(), rng.integers(0, 40, 300).tolist(), rng.integers(1, 11, 300).tolist()))
+        engine = RatingMatrix(*zip(*reviews))
+        for version in range(1, 20):
+            changes = [
+                (int(user), int(movie), None if rng.random() < 0.3 else int(rating))
+                for user, movie, rating in zip(rng.integers(0, 35, 5), rng.integers(0, 45, 5), rng.integers(1, 11, 5))
+            ]
+            engine = engine.apply_changes(changes, version=version)
+            reviews += changes
+            self.assertSameRatings(engine, reviews)
+
+    def test_changes_apply_quickly_to_large_matrices(self):
+        """A new rating costs a few copies of the sparse arrays, not a rebuild; a re-rating is a point update."""
+        rng = np.random.default_rng(0)
+        n = 1_000_000
+        engine = RatingMatrix(rng.integers(0, 100_000, n), rng.integers(0, 20_000, n), rng.integers(1, 11, n) / 2)
+        user_id = int(engine.user_ids[0])
+        rated = int(engine.movie_ids[engine.R.indices[0]])
+
+        started = time.perf_counter()
+        engine = engine.apply_changes([(user_id, 20_001, 4.5), (100_001, rated, 3)], version=1)
+        engine = engine.apply_changes([(user_id, rated, 1)], version=2)
+        self.assertLess(time.perf_counter() - started, 0.25)  # A full rebuild takes several times this
+
+    def test_top_neighbours_and_scores(self):
+        self.assertEqual([user for user, sim in self.engine.top_neighbours(1, k=2)], [2])
+
+        scores = self.engine.score_items(1, {2: 0.9, 3: 0.5}, min_rating=4)
+        # Only unseen movies rated >= 4 by a neighbour, best first
+        self.assertEqual([movie for movie, score in scores], [14, 15])
+        self.assertNotIn(16, [movie for movie, score in self.engine.score_items(1, {4: 1.0}, min_rating=4)])
+        self.assertEqual(self.engine.score_items(1, {}), [])
+
+    def test_scoring_scales_to_large_user_bases(self):
+        """Scoring one user against 10^5 users stays well under 100 ms."""
+        rng = np.random.default_rng(0)
+        n = 1_000_000
+        engine = RatingMatrix(rng.integers(0, 100_000, n), rng.integers(0, 20_000, n), rng.integers(1, 11, n) / 2)
+
+        started = time.perf_counter()
+        neighbours = dict(engine.top_neighbours(int(engine.user_ids[0]), k=50))
+        engine.score_items(int(engine.user_ids[0]), neighbours, min_rating=4)
+        self.assertLess(time.perf_counter() - started, 0.5)  # Generous bound for slow CI machines
+
+
+
+class EngineCacheTestCase(AppTestCase):
+    """Test case for keeping the per-app engine in step with committed reviews."""
+
+    def setUp(self):
+        super().setUp()
+        add_users(1, 2, 3)
+        db.session.add_all([Review(user_id=1, movie_id=10, rating=5), Review(user_id=2, movie_id=10, rating=4)])
+        db.session.commit()
+
+    def ratings(self, engine):
+        return sorted(zip(*(values.tolist() for values in engine.triplets())))
+
+    def test_engine_changes_on_commit_only(self):
+        engine = get_engine()
+        self.assertEqual(self.ratings(engine), [(1, 10, 5.0), (2, 10, 4.0)])
+
+        db.session.add(Review(user_id=3, movie_id=11, rating=2))
+        db.session.flush()
+        self.assertIs(get_engine(), engine)  # Flushed but not committed
+        db.session.rollback()
+        self.assertIs(get_engine(), engine)
+
+        db.session.delete(Review.query.filter_by(user_id=2).one())
+        db.session.commit()
+        self.assertEqual(self.ratings(get_engine()), [(1, 10, 5.0)])
+
+    @patch('writes.get_movie_details', return_value={'genre_ids': []})
+    def test_ratings_are_applied_without_reloading(self, mock_details):
+        get_engine()
+        with patch.object(RatingMatrix, 'from_reviews', side_effect=AssertionError("reloaded")):
+            save_rating(3, 10, 1)
+            save_rating(1, 10, 2)
+            self.assertEqual(self.ratings(get_engine()), [(1, 10, 2.0), (2, 10, 4.0), (3, 10, 1.0)])
+
+
+class SharedVersionTestCase(unittest.TestCase):
+    """Two apps on one database file stand in for two workers."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.directory.name, 'site.db')}"
+
+        self.worker_a, self.worker_b = create_app(FileConfig), create_app(FileConfig)
+
+    def tearDown(self):
+        for app in (self.worker_a, self.worker_b):
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        self.directory.cleanup()
+
+    def ratings(self, app):
+        with app.app_context():
+            return sorted(zip(*(values.tolist() for values in get_engine().triplets())))
+
+    @patch('writes.get_movie_details', return_value={'genre_ids': []})
+    def test_engines_see_other_workers_commits(self, mock_details):
+        with self.worker_a.app_context():
+            add_users(1, 2)
+            save_rating(1, 10, 5)
+        self.assertEqual(self.ratings(self.worker_b), [(1, 10, 5.0)])
+
+        with self.worker_a.app_context():
+            save_rating(2, 10, 3)
+            save_rating(1, 10, 4)
+        with self.worker_b.app_context(), patch.object(RatingMatrix, 'from_reviews', side_effect=AssertionError("reloaded")):
+            self.assertEqual(self.ratings(self.worker_b), [(1, 10, 4.0), (2, 10, 3.0)])
+
+        with self.worker_b.app_context():
+            db.session.delete(Review.query.filter_by(user_id=2).one())
+            db.session.commit()
+        self.assertEqual(self.ratings(self.worker_a), [(1, 10, 4.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from sqlalchemy import func, text
+from app import create_app
+from config import TestingConfig
+from db_engine import engine_options
+from fixtures import add_users
+from models import db, Review, MovieRatingStats
+from writes import save_rating
+
+
+class DbEngineTestCase(unittest.TestCase):
+    """Test case for the configurable engine profile (pool and SQLite pragmas)."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.directory.name, 'site.db')}"
+            DB_POOL_SIZE = 4
+
+        self.app = create_app(FileConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_pragmas_and_pool_are_applied(self):
+        with db.engine.connect() as connection:
+            pragma = lambda name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            self.assertEqual(pragma('journal_mode'), 'wal')
+            self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+            self.assertEqual(pragma('busy_timeout'), 5000)
+            self.assertEqual(pragma('cache_size'), -64 * 1024)
+        self.assertEqual(db.engine.pool.size(), 4)
+
+    def test_memory_database_gets_no_pool_options(self):
+        self.assertEqual(engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}), {})
+        options = engine_options({
+            'SQLALCHEMY_DATABASE_URI': 'postgresql://movies@db/movies', 'DB_POOL_SIZE': 5,
+            'DB_MAX_OVERFLOW': 2, 'DB_POOL_TIMEOUT': 3, 'DB_POOL_RECYCLE': 60
+        })
+        self.assertEqual(options['pool_recycle'], 60)
+        self.assertTrue(options['pool_pre_ping'])
+
+    @patch('writes.get_movie_details', return_value={'genre_ids': []})
+    def test_concurrent_ratings_neither_fail_nor_double_count(self, mock_details):
+        errors = []
+        add_users(*range(1, 9))
+
+        def rate(user_id, rating):
+            with self.app.app_context():
+                try:
+                    save_rating(user_id, 10, rating)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+
+        # Eight users rate once each while user 1 re-rates the same movie from several threads
+        threads = [threading.Thread(target=rate, args=(user_id, 4)) for user_id in range(1, 9)]
+        threads += [threading.Thread(target=rate, args=(1, 2)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        count, total = db.session.query(func.count(Review.id), func.sum(Review.rating)).one()
+        stats = db.session.get(MovieRatingStats, 10)
+        self.assertEqual(count, 8)
+        self.assertEqual((stats.review_count, stats.rating_sum), (count, total))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+from flask import current_app
+from app import create_app
+from config import TestingConfig
+from fanout import fetch_concurrently, with_app_context
+
+
+class FanoutTestCase(unittest.TestCase):
+    """Test case for the concurrent page-section fetches behind the index and /recommend pages."""
+
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_sections_run_concurrently_in_the_app_context(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def section(value):
+            barrier.wait()  # Only returns once all three sections are running at the same time
+            return value, current_app._get_current_object(), threading.current_thread()
+
+        results = fetch_concurrently({name: (lambda name=name: section(name)) for name in ('a', 'b', 'c')})
+
+        self.assertEqual({name: result[0] for name, result in results.items()}, {'a': 'a', 'b': 'b', 'c': 'c'})
+        self.assertTrue(all(result[1] is self.app for result in results.values()))
+        self.assertNotIn(threading.current_thread(), [result[2] for result in results.values()])
+
+    def test_failed_and_late_sections_get_the_default(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def fail():
+            raise RuntimeError("TMDB down")
+
+        started = time.monotonic()
+        results = fetch_concurrently({'ok': lambda: [1], 'failed': fail, 'late': release.wait}, timeout=0.2)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {'ok': [1], 'failed': [], 'late': []})
+        self.assertEqual(fetch_concurrently({'failed': fail}, default=dict), {'failed': {}})
+
+    def test_timeout_defaults_to_the_app_config(self):
+        self.app.config['FANOUT_TIMEOUT'] = 0.1
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.assertEqual(fetch_concurrently({'late': release.wait}), {'late': []})
+
+    def test_with_app_context_carries_the_app_to_other_threads(self):
+        wrapped = with_app_context(lambda: current_app._get_current_object())
+        result = []
+        thread = threading.Thread(target=lambda: result.append(wrapped()))
+        thread.start()
+        thread.join()
+        self.assertIs(result[0], self.app)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
-from app import app, db
+from unittest.mock import patch
+from app import create_app, db
+from config import TestingConfig
+from utils import cache
 from models import User, UserMovies
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
@@ -16,8 +19,7 @@ class WatchlistFavoritesTestCase(unittest.TestCase):
 
     def setUp(self):
         """Set up the test environment."""
-        self.app = app
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app = create_app(TestingConfig)
         self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
         self.app.testing = True
         self.client = self.app.test_client()
@@ -139,6 +141,31 @@ class WatchlistFavoritesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"Your Favorites", response.data)
 
+    @patch('recommendation.get_personalized_recommendations', return_value=[])
+    def test_personalized_cache_invalidated_by_list_changes(self, mock_recs):
+        """Repeat visits are served from cache until the user changes their lists or ratings."""
+        self.login_user()
+        with self.app.app_context():
+            cache.clear()
+
+        self.client.get('/personalized')
+        self.client.get('/personalized')
+        self.assertEqual(mock_recs.call_count, 1)
+
+        self.client.post('/watchlist/add/123')
+        self.client.get('/personalized')
+        self.assertEqual(mock_recs.call_count, 2)
+
+        self.client.post('/watchlist/remove/123')
+        self.client.get('/personalized')
+        self.assertEqual(mock_recs.call_count, 3)
+
+        self.client.post('/rate_movie', json={'movie_id': 123, 'rating': 4})
+        self.client.get('/personalized')
+        self.assertEqual(mock_recs.call_count, 4)
+        with self.app.app_context():
+            cache.clear()
+
 
 if __name__ == '__main__':
     unittest.main()
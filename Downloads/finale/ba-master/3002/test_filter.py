@@ -1,7 +1,9 @@
 import unittest  # Importing the Python unit testing framework
-from app import app, db  # Import the Flask app and the database object from your project
+from app import create_app, db  # Import the app factory and the database object from your project
+from config import TestingConfig
 from models import User, UserMovies  # Import the User and UserMovies models
 from unittest.mock import patch  # Import the patch utility to mock API calls
+from tmdb_client import tmdb  # Import the shared TMDB client
 
 class AppTestCase(unittest.TestCase):
     # This is a test class for our Flask app.
@@ -11,11 +13,11 @@ class AppTestCase(unittest.TestCase):
         # This method runs before each test.
         # We configure the app for testing and create an in-memory database.
 
-        self.app = app  # Use the app from the project
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # Use an in-memory database for testing
+        self.app = create_app(TestingConfig)  # Build an isolated app on an in-memory database
         self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable SQLAlchemy tracking to save resources
         self.app.testing = True  # Set the app in testing mode
         self.client = self.app.test_client()  # Create a test client for simulating HTTP requests
+        tmdb.breaker.reset()  # Start each test with the TMDB circuit breaker closed
 
         # Create the database tables and add a test user
         with self.app.app_context():  # Ensure we're working inside the app context
@@ -68,7 +70,7 @@ class AppTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)  # Check that the response status is 200 (OK)
         self.assertIn(b"Inception", response.data)  # Check if "Inception" is in the response HTML
 
-    @patch('app.requests.get')  # Mock the requests.get function
+    @patch('tmdb_client.tmdb.session.get')  # Mock the pooled TMDB session
     def test_api_fetching(self, mock_get):
         """Test API fetching with mocked response."""
         # This test checks if the app handles API data correctly by mocking the API response.
@@ -81,7 +83,7 @@ class AppTestCase(unittest.TestCase):
         }
 
         # Mock the get_languages() function, which fetches supported languages
-        with patch('app.get_languages', return_value=[{"code": "en", "name": "English"}]):
+        with patch('routes.get_languages', return_value=[{"code": "en", "name": "English"}]):
             # Simulate a GET request to the top-rated movies page
             response = self.client.get('/top-rated')
             self.assertEqual(response.status_code, 200)  # Check that the response status is 200 (OK)
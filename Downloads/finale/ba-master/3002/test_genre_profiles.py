@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch
+from fixtures import AppTestCase, add_users
+from models import db, Review, UserGenreProfile
+from recommendation import get_genre_profiles, get_genre_similarities
+from writes import save_rating
+
+
+class TestGenreProfiles(AppTestCase):
+    """Genre profiles are stored once and updated incrementally."""
+
+    GENRES = {201: [28, 878], 202: [28], 203: [18], 204: [35]}
+
+    def setUp(self):
+        super().setUp()
+        add_users(20, 21, 22)
+        for user_id, movie_id, rating in [(20, 201, 5), (20, 202, 4), (21, 201, 4), (22, 203, 5), (22, 204, 2)]:
+            db.session.add(Review(user_id=user_id, movie_id=movie_id, rating=rating))
+        db.session.commit()
+
+        details = lambda movie_id: {'id': movie_id, 'genre_ids': self.GENRES[movie_id]}
+        patchers = [
+            patch('recommendation.get_movie_details', side_effect=details),
+            patch('recommendation.get_movie_details_many', side_effect=lambda ids: [details(i) for i in ids]),
+            patch('writes.get_movie_details', side_effect=details),
+        ]
+        self.mock_details, self.mock_details_many, _ = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def test_profiles_are_built_once(self):
+        profiles = get_genre_profiles([20, 22])
+        self.assertEqual(profiles[20], {28: 2, 878: 1})
+        self.assertEqual(profiles[22], {18: 1})
+
+        # One lookup covers both users' movies
+        self.assertEqual(self.mock_details_many.call_count, 1)
+        self.assertEqual(sorted(self.mock_details_many.call_args[0][0]), [201, 202, 203])
+
+        self.mock_details_many.reset_mock()
+        self.assertEqual(get_genre_profiles([20])[20], {28: 2, 878: 1})
+        self.mock_details_many.assert_not_called()
+
+    def test_building_profiles_never_commits_the_request_session(self):
+        with patch.object(db.session, 'commit', side_effect=AssertionError("request session committed")):
+            self.assertEqual(get_genre_profiles([21])[21], {28: 1, 878: 1})
+        self.assertEqual(db.session.get(UserGenreProfile, 21).genre_counts, {'28': 1, '878': 1})
+
+    def test_batch_jaccard(self):
+        similarities = get_genre_similarities(20, [21, 22])
+        self.assertEqual(similarities, {21: 1.0, 22: 0.0})
+
+    def test_rating_changes_update_the_profile(self):
+        get_genre_profiles([22])
+        save_rating(22, 204, 5)  # Now rated highly
+        self.assertEqual(get_genre_profiles([22])[22], {18: 1, 35: 1})
+
+        save_rating(22, 203, 1)  # No longer rated highly
+        self.assertEqual(get_genre_profiles([22])[22], {35: 1})
+
+        save_rating(22, 204, 4.5)  # Still high: nothing changes
+        self.assertEqual(get_genre_profiles([22])[22], {35: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+from fixtures import AppTestCase, add_users
+from models import db, Review, ItemNeighbor
+from cf_engine import RatingMatrix
+from item_neighbors import compute_item_neighbors, build_item_neighbors
+from recommendation import get_item_neighbor_recommendations
+
+# Users 1-3 like movies 10 and 11 together; movie 12 is liked by users who dislike 10
+REVIEWS = [
+    (1, 10, 5), (1, 11, 5), (1, 12, 1),
+    (2, 10, 4), (2, 11, 5), (2, 12, 2),
+    (3, 10, 5), (3, 11, 4), (3, 13, 5),
+    (4, 10, 1), (4, 12, 5), (4, 13, 4),
+    (5, 10, 2), (5, 12, 4),
+    (6, 10, 5),
+]
+
+
+class ItemNeighborsTestCase(AppTestCase):
+    """Test case for the offline item-item similarity build."""
+
+    def setUp(self):
+        super().setUp()
+        add_users(*{user_id for user_id, movie_id, rating in REVIEWS})
+        for user_id, movie_id, rating in REVIEWS:
+            db.session.add(Review(user_id=user_id, movie_id=movie_id, rating=rating))
+        db.session.commit()
+
+    def test_neighbours_require_co_raters_and_positive_similarity(self):
+        neighbours = {}
+        for movie_id, neighbor_id, score in compute_item_neighbors(RatingMatrix(*zip(*REVIEWS))):
+            neighbours.setdefault(movie_id, []).append(neighbor_id)
+
+        self.assertEqual(neighbours[10][0], 11)
+        self.assertNotIn(12, neighbours.get(10, []))  # Rated in opposite directions
+        self.assertNotIn(13, neighbours.get(11, []))  # Only one co-rater
+
+    def test_build_and_read_precomputed_neighbours(self):
+        self.assertGreater(build_item_neighbors(k=5), 0)
+        self.assertEqual(ItemNeighbor.query.filter_by(movie_id=10, neighbor_id=11).count(), 1)
+
+        # User 6 has only rated movie 10, so its recommendations are the neighbours of 10
+        with patch('recommendation.get_movie_details_many', side_effect=lambda ids: [{'id': i} for i in ids]):
+            recommendations = get_item_neighbor_recommendations(6)
+        self.assertEqual(recommendations[0]['id'], 11)
+        self.assertNotIn(10, [movie['id'] for movie in recommendations])
+
+        # Rebuilding replaces the table instead of appending to it
+        count = ItemNeighbor.query.count()
+        build_item_neighbors(k=5)
+        self.assertEqual(ItemNeighbor.query.count(), count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest  # Import the unittest framework
-from app import app, db  # Import the Flask app and the database object
+from app import create_app, db  # Import the app factory and the database object
+from config import TestingConfig
 from models import User  # Import the User model
 
 class AuthTestCase(unittest.TestCase):
@@ -9,8 +10,7 @@ class AuthTestCase(unittest.TestCase):
         """Set up the test environment."""
         # This method runs before every test to set up the environment.
 
-        self.app = app  # Use the app instance from the project
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # Use an in-memory database for isolated testing
+        self.app = create_app(TestingConfig)  # Build an isolated app on an in-memory database
         self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable SQLAlchemy tracking to save resources
         self.app.testing = True  # Enable testing mode for Flask
         self.client = self.app.test_client()  # Create a test client for simulating HTTP requests
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from cf_engine import RatingMatrix
+from mf_model import FactorModel
+
+
+def low_rank_ratings(n_users=60, n_movies=40, density=0.5, seed=1):
+    """Ratings generated from two hidden tastes, so a 2-factor model can recover them."""
+    rng = np.random.default_rng(seed)
+    users, movies = rng.normal(size=(n_users, 2)), rng.normal(size=(n_movies, 2))
+    full = np.clip(3 + users @ movies.T, 0, 5)
+    mask = rng.random(full.shape) < density
+    user_ids, movie_ids = np.nonzero(mask)
+    return full, user_ids + 1, movie_ids + 100, full[mask]
+
+
+class FactorModelTestCase(unittest.TestCase):
+    """Test case for the ALS matrix factorization recommender."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.full, user_ids, movie_ids, ratings = low_rank_ratings()
+        cls.engine = RatingMatrix(user_ids, movie_ids, ratings)
+        cls.model = FactorModel.train(cls.engine, factors=2, regularization=0.01, iterations=20)
+
+    def test_training_fits_held_out_structure(self):
+        predictions = self.model.user_factors @ self.model.item_factors.T + self.model.global_mean
+        self.assertEqual(self.model.item_factors.dtype, np.float32)
+        self.assertLess(np.sqrt(np.mean((predictions - self.full) ** 2)), 0.5)
+
+    def test_fold_in_matches_trained_vector(self):
+        """Folding in an existing user's ratings lands close to the vector ALS learned for them."""
+        user_id = 5
+        row = self.engine.R[self.engine.user_index[user_id]]
+        ratings = {int(self.engine.movie_ids[j]): rating for j, rating in zip(row.indices, row.data)}
+        vector = self.model.fold_in(ratings, regularization=0.01)
+
+        trained = self.model.user_factors[self.model.user_index[user_id]]
+        self.assertLess(np.linalg.norm(vector - trained) / np.linalg.norm(trained), 0.05)
+        self.assertIsNone(self.model.fold_in({99999: 5}))
+
+    def test_recommend_excludes_rated_movies_and_ranks_best_first(self):
+        vector = self.model.user_factors[0]
+        rated = {100, 101, 102}
+        recommendations = self.model.recommend(vector, n=5, exclude=rated)
+
+        self.assertEqual(len(recommendations), 5)
+        self.assertFalse(rated & {movie_id for movie_id, score in recommendations})
+        scores = [score for movie_id, score in recommendations]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'mf_model.npz')
+            self.model.save(path)
+            loaded = FactorModel.load(path)
+        np.testing.assert_array_equal(loaded.item_factors, self.model.item_factors)
+        self.assertEqual(loaded.movie_index, self.model.movie_index)
+        self.assertEqual(loaded.trained_at, self.model.trained_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
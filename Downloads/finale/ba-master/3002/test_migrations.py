@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from models import db, Movie, Review, UserMovies, MovieRatingStats, UserGenreProfile
+from migrations import MIGRATIONS, current_version, migrate
+from catalogue import get_catalogued, save_details
+from review_pages import get_review_page, decode_cursor
+
+# The tables as the app created them before migrations existed: primary keys only
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(150) NOT NULL UNIQUE,
+                           password_hash VARCHAR(200) NOT NULL)""",
+    """CREATE TABLE reviews (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+                             movie_id INTEGER NOT NULL, rating FLOAT NOT NULL, review_text TEXT, created_at DATETIME)""",
+    """CREATE TABLE user_movies (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+                                 movie_id INTEGER NOT NULL, category VARCHAR(50) NOT NULL)""",
+    """CREATE TABLE movies (id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, genre VARCHAR(100),
+                            release_date DATE, language VARCHAR(50), rating FLOAT)""",
+    "INSERT INTO users VALUES (1, 'ann', 'x'), (2, 'bob', 'y')",
+    "INSERT INTO movies (id, title, genre, rating) VALUES (10, 'Old Entry', 'Drama', 7.5)",
+    """INSERT INTO reviews (id, user_id, movie_id, rating, review_text) VALUES
+       (1, 1, 10, 3, 'first take'), (2, 2, 10, 8, NULL), (3, 1, 10, 9, 'changed my mind'), (4, 1, 11, 5, NULL)""",
+    """INSERT INTO user_movies (id, user_id, movie_id, category) VALUES
+       (1, 1, 10, 'watchlist'), (2, 1, 10, 'watchlist'), (3, 1, 10, 'favorites'), (4, 2, 11, 'watchlist')""",
+]
+
+
+class MigrationsTestCase(unittest.TestCase):
+    """Test case for applying schema migrations to an existing database."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.directory.name, 'site.db')}"
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        with db.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("CREATE TABLE user_genre_profiles (user_id INTEGER PRIMARY KEY, genre_counts JSON NOT NULL, updated_at DATETIME NOT NULL)"))
+            connection.execute(text("INSERT INTO user_genre_profiles VALUES (1, '{\"28\": 3}', '2024-01-01'), (2, '{\"18\": 1}', '2024-01-01')"))
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def index_names(self, table):
+        return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+    def test_upgrade_keeps_data_and_adds_constraints(self):
+        self.assertEqual(migrate(), [version for version, description, step in MIGRATIONS])
+
+        # Latest review per (user, movie) and the first list entry per (user, movie, category) survive
+        reviews = {(review.user_id, review.movie_id): (review.id, review.rating, review.review_text) for review in Review.query}
+        self.assertEqual(reviews, {(1, 10): (3, 9, 'changed my mind'), (2, 10): (2, 8, None), (1, 11): (4, 5, None)})
+        self.assertEqual(sorted(entry.id for entry in UserMovies.query), [1, 3, 4])
+
+        self.assertTrue({'uq_reviews_user_movie', 'ix_reviews_user_rating', 'ix_reviews_movie_created',
+                         'ix_reviews_movie_rating_user'} <= self.index_names('reviews'))
+        self.assertTrue({'uq_user_movies_user_movie_category', 'ix_user_movies_user_category_id'} <= self.index_names('user_movies'))
+
+        # Stats are backfilled from the deduplicated reviews; the affected user's genre profile is rebuilt later
+        self.assertEqual(db.session.get(MovieRatingStats, 10).review_count, 2)
+        self.assertEqual(db.session.get(MovieRatingStats, 10).rating_sum, 17)
+        self.assertEqual([profile.user_id for profile in UserGenreProfile.query], [2])
+
+        db.session.add(Review(user_id=2, movie_id=10, rating=1))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_upgrade_requires_review_dates(self):
+        migrate()
+        self.assertEqual(Review.query.filter(Review.created_at.is_(None)).count(), 0)
+        # Reviews without a date page as the oldest, so a cursor can always be built from them
+        reviews, cursor = get_review_page(10, limit=1)
+        self.assertEqual(decode_cursor(cursor), (datetime(1970, 1, 1), reviews[0].id))
+
+        with self.assertRaises(IntegrityError):
+            with db.engine.begin() as connection:
+                connection.execute(text("INSERT INTO reviews (user_id, movie_id, rating) VALUES (2, 12, 4)"))
+        with self.assertRaises(IntegrityError):
+            with db.engine.begin() as connection:
+                connection.execute(text("UPDATE reviews SET created_at = NULL"))
+
+    def test_upgrade_adds_catalogue_columns_to_movies(self):
+        migrate()
+        self.assertIn('ix_movies_updated_at', self.index_names('movies'))
+
+        # The pre-catalogue row is kept but doesn't count as catalogued until its details are fetched
+        old = db.session.get(Movie, 10)
+        self.assertEqual((old.title, old.rating, old.has_details), ('Old Entry', 7.5, False))
+        self.assertEqual(get_catalogued([10]), {})
+
+        save_details([{'id': 10, 'title': 'Old Entry', 'overview': 'Now with details', 'release_date': '2001-02-03',
+                       'rating': 7.9, 'language': 'en', 'genres': [], 'genre_ids': [], 'director': 'Someone',
+                       'main_characters': [], 'poster': None, 'backdrop': None}])
+        db.session.expire_all()  # Written through a session of its own
+        self.assertEqual(get_catalogued([10])[10].overview, 'Now with details')
+
+    def test_migrations_are_recorded_and_not_reapplied(self):
+        migrate(target=1)
+        with db.engine.connect() as connection:
+            self.assertEqual(current_version(connection), 1)
+        self.assertNotIn('uq_reviews_user_movie', self.index_names('reviews'))
+        self.assertEqual(Review.query.count(), 4)
+
+        self.assertEqual(migrate(), [2, 3, 4, 5, 6])
+        self.assertEqual(migrate(), [])
+
+        # Every step is safe to re-run should two processes race on one version
+        for version, description, step in MIGRATIONS:
+            with db.engine.begin() as connection:
+                step(connection)
+        self.assertEqual(Review.query.count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
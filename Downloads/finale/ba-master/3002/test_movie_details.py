@@ -0,0 +1,170 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+from app import create_app
+from config import TestingConfig
+from models import db, Movie
+from utils import cache, get_movie_details, get_movie_details_many, MISSING_MOVIE_TIMEOUT
+from tmdb_client import tmdb
+
+# Raw TMDB payload for /movie/{id}?append_to_response=credits
+TMDB_MOVIE = {
+    'id': 27205,
+    'title': 'Inception',
+    'overview': 'A thief who steals corporate secrets...',
+    'release_date': '2010-07-15',
+    'vote_average': 8.4,
+    'original_language': 'en',
+    'poster_path': '/poster.jpg',
+    'backdrop_path': None,
+    'genres': [{'id': 28, 'name': 'Action'}, {'id': 878, 'name': 'Science Fiction'}],
+    'budget': 160000000,
+    'production_companies': [{'id': 923, 'name': 'Legendary Pictures'}],
+    'credits': {
+        'cast': [{'name': f'Actor {i}'} for i in range(10)],
+        'crew': [{'name': 'Someone Else', 'job': 'Producer'}, {'name': 'Christopher Nolan', 'job': 'Director'}]
+    }
+}
+
+
+class MovieDetailsTestCase(unittest.TestCase):
+    """Test case for fetching and caching movie details."""
+
+    def setUp(self):
+        # Each test gets its own in-memory catalogue instead of the app's database
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        cache.clear()
+        tmdb.breaker.reset()
+
+    def tearDown(self):
+        cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def mock_response(self, status_code=200, payload=None):
+        response = MagicMock(status_code=status_code)
+        response.json.return_value = payload or {}
+        return response
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_details_and_credits_in_one_request(self, mock_get):
+        """Details and credits are fetched with a single append_to_response call."""
+        mock_get.return_value = self.mock_response(payload=TMDB_MOVIE)
+
+        movie = get_movie_details(27205)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args.kwargs['params']['append_to_response'], 'credits')
+        self.assertEqual(movie['director'], 'Christopher Nolan')
+        self.assertEqual(movie['main_characters'], [f'Actor {i}' for i in range(5)])
+        self.assertEqual(movie['genre_ids'], [28, 878])
+        self.assertEqual(movie['rating'], 8.4)
+        self.assertEqual(movie['poster'], 'https://image.tmdb.org/t/p/original/poster.jpg')
+        self.assertIn('placeholder', movie['backdrop'])
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_cached_entry_is_compact(self, mock_get):
+        """Only the rendered fields are cached, under a single key."""
+        mock_get.return_value = self.mock_response(payload=TMDB_MOVIE)
+
+        get_movie_details(27205)
+        cached = cache.get('movie_details_27205')['value']
+
+        self.assertNotIn('credits', cached)
+        self.assertNotIn('budget', cached)
+        self.assertNotIn('production_companies', cached)
+        self.assertIsNone(cache.get('movie_credits_27205'))
+
+        # A second lookup is served from the cache
+        self.assertEqual(get_movie_details(27205), cached)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_missing_movie_returns_none(self, mock_get):
+        """A non-200 response yields None."""
+        mock_get.return_value = self.mock_response(status_code=404)
+        self.assertIsNone(get_movie_details(1))
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_missing_movie_is_negatively_cached(self, mock_get):
+        """A 404 is remembered for a short TTL; repeated lookups don't reach TMDB."""
+        mock_get.return_value = self.mock_response(status_code=404)
+        get_movie_details(1)
+        self.assertIsNone(get_movie_details(1))
+        self.assertEqual(get_movie_details_many([1, 1]), [None, None])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertLessEqual(cache.get('movie_details_1')['soft_expiry'], time.time() + MISSING_MOVIE_TIMEOUT)
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_dead_movie_page_is_a_cached_404(self, mock_get):
+        mock_get.return_value = self.mock_response(status_code=404)
+        client = self.app.test_client()
+        self.assertEqual(client.get('/movie/1').status_code, 404)
+        self.assertEqual(client.get('/movie/1').status_code, 404)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('tmdb_client.time.sleep')
+    @patch('tmdb_client.tmdb.session.get')
+    def test_server_errors_are_not_cached(self, mock_get, mock_sleep):
+        mock_get.return_value = self.mock_response(status_code=503)
+        self.assertIsNone(get_movie_details(1))
+        self.assertIsNone(cache.get('movie_details_1'))
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_batch_details_dedupe_and_order(self, mock_get):
+        """The batch API fetches each missing ID once and keeps the input order."""
+        def respond(url, params=None, timeout=None):
+            movie_id = int(url.rsplit('/', 1)[-1])
+            if movie_id == 3:
+                return self.mock_response(status_code=404)
+            return self.mock_response(payload=dict(TMDB_MOVIE, id=movie_id, title=f'Movie {movie_id}'))
+        mock_get.side_effect = respond
+
+        # Movie 1 is already cached, so only 2 and 3 reach TMDB
+        cache.set('movie_details_1', {'value': {'id': 1, 'title': 'Cached'}, 'soft_expiry': time.time() + 60})
+        movies = get_movie_details_many([2, 1, 3, 2])
+
+        self.assertEqual([movie and movie['title'] for movie in movies], ['Movie 2', 'Cached', None, 'Movie 2'])
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(get_movie_details_many([]), [])
+
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_details_are_written_through_to_catalogue(self, mock_get):
+        """After the cache is lost, details come from the catalogue without calling TMDB."""
+        mock_get.return_value = MagicMock(status_code=200, json=MagicMock(return_value=TMDB_MOVIE))
+        movie = get_movie_details(27205)
+
+        cache.clear()
+        mock_get.reset_mock()
+        self.assertEqual(get_movie_details(27205), movie)
+        self.assertEqual(get_movie_details_many([27205]), [movie])
+        mock_get.assert_not_called()
+
+    @patch('tmdb_client.time.sleep')
+    @patch('tmdb_client.tmdb.session.get')
+    def test_stale_catalogue_row_is_refetched_or_served(self, mock_get, mock_sleep):
+        mock_get.return_value = MagicMock(status_code=200, json=MagicMock(return_value=TMDB_MOVIE))
+        get_movie_details(27205)
+        Movie.query.filter_by(id=27205).update({'updated_at': datetime.utcnow() - timedelta(days=30)})
+        db.session.commit()
+        cache.clear()
+
+        # TMDB down: the stale row is still served
+        mock_get.return_value = MagicMock(status_code=503)
+        self.assertEqual(get_movie_details(27205)['title'], 'Inception')
+
+        # TMDB back: the row is refreshed
+        mock_get.return_value = MagicMock(status_code=200, json=MagicMock(return_value={**TMDB_MOVIE, 'title': 'Inception (2010)'}))
+        self.assertEqual(get_movie_details(27205)['title'], 'Inception (2010)')
+        db.session.expire_all()
+        self.assertGreater(db.session.get(Movie, 27205).updated_at, datetime.utcnow() - timedelta(minutes=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
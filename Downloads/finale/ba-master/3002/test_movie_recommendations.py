@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from fixtures import AppTestCase
+from recommendation import get_movie_recommendations, get_content_recommendations
+from tmdb_client import tmdb
+from utils import cache
+
+
+class TestMovieRecommendations(AppTestCase):
+    """TMDB recommendations are fetched by movie ID, cached per ID and fanned out across seeds."""
+
+    def setUp(self):
+        super().setUp()
+        tmdb.breaker.reset()
+        cache.clear()
+
+    @staticmethod
+    def response_for(url, params=None, **kwargs):
+        movie_id = int(url.rstrip('/').split('/')[-2])
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'results': [{'id': movie_id * 10}, {'id': 999}]}
+        return response
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_one_request_per_movie_id_then_cached(self, mock_get):
+        mock_get.side_effect = self.response_for
+
+        first = get_movie_recommendations(7)
+        second = get_movie_recommendations(7)
+
+        self.assertEqual([movie['id'] for movie in first], [70, 999])
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(mock_get.call_args[0][0].endswith('/movie/7/recommendations'))
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_fan_out_merges_in_seed_order(self, mock_get):
+        mock_get.side_effect = self.response_for
+
+        merged = get_content_recommendations([1, 2, 3, 2])
+
+        self.assertEqual([movie['id'] for movie in merged], [10, 999, 20, 30])
+        self.assertEqual(mock_get.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from sqlalchemy import event
+from fixtures import AppTestCase, add_users
+from models import db, Review, MovieRatingStats
+from rating_stats import avg_ratings, rebuild_rating_stats
+from utils import get_similar_movie_ratings
+
+class RatingStatsTestCase(AppTestCase):
+    """Test case for the per-movie ratings summary maintained on review writes."""
+
+    def setUp(self):
+        super().setUp()
+        add_users(1, 2, 3)
+        for user_id, movie_id, rating in [(1, 10, 8), (2, 10, 6), (1, 11, 3)]:
+            db.session.add(Review(user_id=user_id, movie_id=movie_id, rating=rating))
+        db.session.commit()
+
+    def stats(self, movie_id):
+        row = db.session.get(MovieRatingStats, movie_id)
+        return (row.review_count, row.rating_sum) if row else None
+
+    def test_summary_follows_inserts_updates_and_deletes(self):
+        self.assertEqual(self.stats(10), (2, 14))
+        self.assertEqual(avg_ratings([10, 11, 12]), {10: 7.0, 11: 3.0})
+
+        review = Review.query.filter_by(user_id=2, movie_id=10).first()
+        review.rating = 9
+        db.session.commit()
+        self.assertEqual(self.stats(10), (2, 17))
+
+        review.review_text = "Only the text changed"
+        db.session.commit()
+        self.assertEqual(self.stats(10), (2, 17))
+
+        db.session.delete(review)
+        db.session.commit()
+        self.assertEqual(self.stats(10), (1, 8))
+
+        db.session.delete(Review.query.filter_by(movie_id=11).first())
+        db.session.commit()
+        self.assertNotIn(11, avg_ratings([11]))
+
+    def test_summary_rolls_back_with_the_review(self):
+        db.session.add(Review(user_id=3, movie_id=10, rating=1))
+        db.session.flush()
+        self.assertEqual(self.stats(10), (3, 15))
+        db.session.rollback()
+        self.assertEqual(self.stats(10), (2, 14))
+
+    def test_similar_movie_averages_take_one_query(self):
+        statements = []
+        record = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            movies = get_similar_movie_ratings([{'id': movie_id} for movie_id in range(5, 25)])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(movies[5]['average_rating'], 7.0)
+        self.assertEqual(movies[0]['average_rating'], "No ratings yet")
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        before = avg_ratings([10, 11])
+        db.session.query(MovieRatingStats).delete()
+        db.session.commit()
+        self.assertEqual(avg_ratings([10, 11]), {})
+
+        self.assertEqual(rebuild_rating_stats(), 2)
+        self.assertEqual(avg_ratings([10, 11]), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
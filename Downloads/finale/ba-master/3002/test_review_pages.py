@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from config import TestingConfig
+from models import User, Review
+from review_pages import get_review_page
+
+
+class ReviewPagesTestCase(unittest.TestCase):
+    """Test case for keyset-paginated reviews on the movie details page."""
+
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            users = [User(username=f'user{i}', password='password') for i in range(25)]
+            db.session.add_all(users)
+            db.session.flush()
+            # Pairs of reviews share a timestamp, so pages must break ties on id
+            start = datetime(2024, 1, 1)
+            for i, user in enumerate(users):
+                db.session.add(Review(user_id=user.id, movie_id=5, rating=i % 10, review_text=f'Review {i}',
+                                      created_at=start + timedelta(minutes=i // 2)))
+            db.session.add(Review(user_id=users[0].id, movie_id=6, rating=1, created_at=start))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_pages_cover_every_review_once_newest_first(self):
+        with self.app.app_context():
+            expected = [review.id for review in Review.query.filter_by(movie_id=5)
+                        .order_by(Review.created_at.desc(), Review.id.desc())]
+            seen, cursor = [], None
+            while True:
+                reviews, cursor = get_review_page(5, cursor, limit=7)
+                seen += [review.id for review in reviews]
+                if cursor is None:
+                    break
+            self.assertEqual(seen, expected)
+
+    def test_users_are_loaded_in_the_same_query(self):
+        with self.app.app_context():
+            statements = []
+            record = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                reviews, cursor = get_review_page(5, limit=10)
+                usernames = [review.user.username for review in reviews]
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(usernames[0], 'user24')
+
+    def test_load_more_endpoint(self):
+        first = self.client.get('/movie/5/reviews?limit=20').get_json()
+        self.assertEqual(len(first['reviews']), 20)
+        self.assertEqual(first['reviews'][0]['review_text'], 'Review 24')
+
+        rest = self.client.get('/movie/5/reviews', query_string={'cursor': first['next_cursor']}).get_json()
+        self.assertEqual([review['username'] for review in rest['reviews']], [f'user{i}' for i in range(4, -1, -1)])
+        self.assertIsNone(rest['next_cursor'])
+
+        self.assertEqual(self.client.get('/movie/5/reviews?cursor=garbage').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
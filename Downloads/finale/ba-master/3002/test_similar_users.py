@@ -0,0 +1,41 @@
+import unittest
+from sqlalchemy import event
+from fixtures import AppTestCase, add_users
+from models import db, Review
+from recommendation import get_similar_users
+
+
+class TestSimilarUsers(AppTestCase):
+    """Neighbour discovery runs as one aggregated query, ordered by overlap."""
+
+    def setUp(self):
+        super().setUp()
+        reviews = [
+            (10, 1, 9), (10, 2, 8), (10, 3, 7), (10, 4, 2),
+            (11, 1, 6), (11, 2, 9), (11, 3, 8),   # 3 shared movies
+            (12, 1, 7), (12, 2, 6),               # 2 shared movies
+            (13, 1, 9), (13, 4, 9),               # Only 1 shared movie rated >= 5 by user 10
+            (14, 1, 3), (14, 2, 4), (14, 3, 2),   # Low ratings don't count
+        ]
+        add_users(10, 11, 12, 13, 14)
+        for user_id, movie_id, rating in reviews:
+            db.session.add(Review(user_id=user_id, movie_id=movie_id, rating=rating))
+        db.session.commit()
+
+    def test_similar_users_ordered_by_overlap(self):
+        self.assertEqual(get_similar_users(10), [11, 12])
+        self.assertEqual(get_similar_users(10, limit=1), [11])
+
+    def test_similar_users_uses_a_single_query(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            get_similar_users(10)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(statements), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
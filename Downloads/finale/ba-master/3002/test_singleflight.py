@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from app import create_app
+from config import TestingConfig
+from singleflight import SingleFlight
+from utils import cache, get_movie_details
+from tmdb_client import tmdb
+
+app = create_app(TestingConfig)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Test case for coalescing concurrent cache misses."""
+
+    def run_concurrently(self, target, count=10):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_fetch(self):
+        """Only the first caller runs the fetch; the rest wait for its result."""
+        flight = SingleFlight()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'id': 1}
+
+        results = self.run_concurrently(lambda: flight.do('movie_1', fetch))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'id': 1}] * 10)
+        self.assertFalse(flight.in_flight('movie_1'))
+
+    def test_errors_propagate_to_waiters(self):
+        """Waiters see the leader's exception instead of hanging."""
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('TMDB down')
+
+        errors = []
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        call()
+        leader.join()
+        self.assertEqual(errors, ['TMDB down', 'TMDB down'])
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_movie_details_misses_are_coalesced(self, mock_get):
+        """Concurrent misses on the same movie hit TMDB once."""
+        def slow_response(*args, **kwargs):
+            time.sleep(0.1)
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'id': 550, 'title': 'Fight Club', 'genres': []}
+            return response
+        mock_get.side_effect = slow_response
+
+        def lookup():
+            with app.app_context():
+                return get_movie_details(550)['title']
+
+        with app.app_context():
+            cache.clear()
+        tmdb.breaker.reset()
+        results = self.run_concurrently(lookup)
+
+        self.assertEqual(results, ['Fight Club'] * 10)
+        self.assertEqual(mock_get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
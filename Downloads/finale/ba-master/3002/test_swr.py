@@ -0,0 +1,117 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from app import create_app
+from config import TestingConfig
+from utils import cache
+import swr
+from swr import get_or_fetch, Uncacheable
+from tmdb_client import CircuitBreaker, tmdb
+
+app = create_app(TestingConfig)
+
+
+class StaleWhileRevalidateTestCase(unittest.TestCase):
+    """Test case for soft/hard TTL cache reads."""
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        self.app_context.pop()
+
+    def wait_for_refreshes(self):
+        swr.refresh_executor.submit(lambda: None).result()
+        while swr._pending:
+            time.sleep(0.01)
+
+    def test_fresh_entry_does_not_reload(self):
+        loader = MagicMock(return_value=['fresh'])
+        self.assertEqual(get_or_fetch('key', loader, 60, 600), ['fresh'])
+        self.assertEqual(get_or_fetch('key', loader, 60, 600), ['fresh'])
+        loader.assert_called_once()
+
+    def test_stale_entry_is_served_and_refreshed(self):
+        """Past the soft TTL the stale value comes back at once and a refresh replaces it."""
+        cache.set('key', {'value': ['stale'], 'soft_expiry': time.time() - 1}, timeout=600)
+        loader = MagicMock(return_value=['new'])
+
+        self.assertEqual(get_or_fetch('key', loader, 60, 600), ['stale'])
+        self.wait_for_refreshes()
+
+        loader.assert_called_once()
+        self.assertEqual(get_or_fetch('key', loader, 60, 600), ['new'])
+
+    def test_failed_refresh_keeps_stale_entry(self):
+        """A loader returning None (TMDB down) leaves the stale value in place."""
+        cache.set('key', {'value': ['stale'], 'soft_expiry': time.time() - 1}, timeout=600)
+        loader = MagicMock(return_value=None)
+
+        get_or_fetch('key', loader, 60, 600)
+        self.wait_for_refreshes()
+
+        self.assertEqual(cache.get('key')['value'], ['stale'])
+
+    def test_cold_miss_failures_are_not_cached(self):
+        self.assertIsNone(get_or_fetch('key', MagicMock(return_value=None), 60, 600))
+        self.assertEqual(get_or_fetch('key', MagicMock(return_value=Uncacheable(['partial'])), 60, 600), ['partial'])
+        self.assertIsNone(cache.get('key'))
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    """Test case for the TMDB circuit breaker."""
+
+    def test_breaker_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        for _ in range(3):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        # After the cool-down a single probe is let through
+        breaker.opened_at -= 31
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    @patch('tmdb_client.time.sleep')
+    @patch('tmdb_client.tmdb.session.get')
+    def test_open_breaker_short_circuits_requests(self, mock_get, mock_sleep):
+        tmdb.breaker.reset()
+        mock_get.return_value = MagicMock(status_code=503)
+        for _ in range(tmdb.breaker.failure_threshold):
+            tmdb.get('/movie/top_rated')
+        calls = mock_get.call_count
+
+        self.assertIsNone(tmdb.get('/movie/top_rated'))
+        self.assertEqual(mock_get.call_count, calls)
+        self.assertEqual(tmdb.stats()['circuit'], 'open')
+        tmdb.breaker.reset()
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_probe_that_raises_reopens_the_breaker(self, mock_get):
+        tmdb.breaker.reset()
+        for _ in range(tmdb.breaker.failure_threshold):
+            tmdb.breaker.record_failure()
+        tmdb.breaker.opened_at -= tmdb.breaker.reset_timeout
+
+        mock_get.side_effect = ValueError("unexpected")
+        with self.assertRaises(ValueError):
+            tmdb.get('/movie/top_rated')
+        self.assertEqual(tmdb.breaker.state, 'open')
+
+        # The next cool-down lets another probe through instead of blocking TMDB for good
+        tmdb.breaker.opened_at -= tmdb.breaker.reset_timeout
+        mock_get.side_effect = None
+        mock_get.return_value = MagicMock(status_code=200)
+        self.assertEqual(tmdb.get('/movie/top_rated').status_code, 200)
+        self.assertEqual(tmdb.breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
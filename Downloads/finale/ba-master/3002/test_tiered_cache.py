@@ -0,0 +1,82 @@
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from tiered_cache import TieredCache
+
+
+class TieredCacheTestCase(unittest.TestCase):
+    """Test case for the in-process LRU + shared SQLite cache backend."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+        self.cache = TieredCache(self.path, memory_limit=10_000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_set_get_delete(self):
+        self.assertTrue(self.cache.set('movie_1', {'id': 1, 'title': 'Fight Club'}))
+        self.assertEqual(self.cache.get('movie_1'), {'id': 1, 'title': 'Fight Club'})
+        self.assertTrue(self.cache.has('movie_1'))
+        self.assertTrue(self.cache.delete('movie_1'))
+        self.assertIsNone(self.cache.get('movie_1'))
+
+    def test_second_worker_reads_shared_tier(self):
+        """A value written by one worker is visible to another process using the same file."""
+        self.cache.set('movie_1', {'id': 1})
+        other_worker = TieredCache(self.path, memory_limit=10_000)
+        self.assertEqual(other_worker.get('movie_1'), {'id': 1})
+
+        # Deletes go through to the shared tier too
+        other_worker.delete('movie_1')
+        self.assertIsNone(TieredCache(self.path).get('movie_1'))
+
+    def test_delete_reaches_other_workers_local_copies(self):
+        """An invalidation in one worker is seen by another within its local refresh window."""
+        other_worker = TieredCache(self.path, memory_limit=10_000)
+        self.cache.set('recs_1', ['old'])
+        self.assertEqual(other_worker.get('recs_1'), ['old'])  # Now held in its local tier
+        self.assertIn('recs_1', other_worker._local)
+
+        self.cache.delete('recs_1')
+        self.assertIsNone(other_worker.get('recs_1'))
+
+        self.cache.set('recs_1', ['new'])
+        self.assertEqual(other_worker.get('recs_1'), ['new'])
+        self.cache.clear()
+        self.assertFalse(other_worker.has('recs_1'))
+
+    def test_expired_entries_are_not_returned(self):
+        self.cache.set('short', 'value', timeout=1)
+        self.cache.set('forever', 'value', timeout=0)
+        self.cache._local.clear()
+        self.cache._local_bytes = 0
+        future = time.time() + 5
+        with patch('tiered_cache.time.time', return_value=future):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+            self.assertTrue(self.cache.add('short', 'new'))
+        self.assertFalse(self.cache.add('forever', 'new'))
+
+    def test_local_tier_is_bounded_by_bytes(self):
+        """The LRU evicts the least recently used entries once the pickled size exceeds the limit."""
+        value = 'x' * 3000
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, value)
+        self.cache.get('a')  # 'a' becomes most recently used
+        self.cache.set('d', value)
+
+        self.assertLessEqual(self.cache._local_bytes, 10_000)
+        self.assertEqual(list(self.cache._local), ['c', 'a', 'd'])
+        self.assertEqual(self.cache._local_bytes, 3 * size)
+        # Evicted entries are still served from the shared tier
+        self.assertEqual(self.cache.get('b'), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
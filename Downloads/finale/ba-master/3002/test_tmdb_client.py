@@ -0,0 +1,207 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import requests
+import tmdb_client
+from tmdb_client import TmdbClient, TokenBucket, AdaptiveConcurrencyLimit, endpoint_name
+
+
+class TmdbClientTestCase(unittest.TestCase):
+    """Test case for the pooled TMDB client."""
+
+    def setUp(self):
+        self.client = TmdbClient(api_key='test-key')
+
+    def test_endpoint_name_collapses_ids(self):
+        """Numeric path segments are collapsed into an {id} placeholder."""
+        self.assertEqual(endpoint_name('/movie/550'), '/movie/{id}')
+        self.assertEqual(endpoint_name('/movie/550/credits'), '/movie/{id}/credits')
+        self.assertEqual(endpoint_name('https://api.themoviedb.org/3/movie/top_rated'), '/movie/top_rated')
+
+    def test_get_adds_api_key_and_timeout(self):
+        """The API key is injected and the per-endpoint timeout is applied."""
+        response = MagicMock(status_code=200)
+        with patch.object(self.client.session, 'get', return_value=response) as mock_get:
+            result = self.client.get('/movie/550', params={'language': 'en-US'})
+
+        self.assertIs(result, response)
+        mock_get.assert_called_once_with(
+            'https://api.themoviedb.org/3/movie/550',
+            params={'api_key': 'test-key', 'language': 'en-US'},
+            timeout=tmdb_client.ENDPOINT_POLICIES['/movie/{id}'][0]
+        )
+
+    @patch('tmdb_client.time.sleep')
+    def test_get_retries_server_errors(self, mock_sleep):
+        """5xx responses are retried until a good response arrives."""
+        responses = [MagicMock(status_code=503), MagicMock(status_code=200)]
+        with patch.object(self.client.session, 'get', side_effect=responses) as mock_get:
+            result = self.client.get('/movie/550')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('tmdb_client.time.sleep')
+    def test_get_returns_none_when_unreachable(self, mock_sleep):
+        """Transport errors never escape the client."""
+        with patch.object(self.client.session, 'get', side_effect=requests.ConnectionError('down')):
+            self.assertIsNone(self.client.get('/search/movie', params={'query': 'Inception'}))
+            self.assertIsNone(self.client.get_json('/search/movie', params={'query': 'Inception'}))
+
+    @patch('tmdb_client.time.sleep')
+    def test_throttled_requests_honour_retry_after(self, mock_sleep):
+        """A 429 is retried after the Retry-After delay and counted per endpoint."""
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '2'})
+        responses = [throttled, MagicMock(status_code=200)]
+        with patch.object(self.client.session, 'get', side_effect=responses):
+            result = self.client.get('/movie/550')
+
+        self.assertEqual(result.status_code, 200)
+        mock_sleep.assert_called_once_with(2.0)
+        counters = self.client.stats()['endpoints']['/movie/{id}']
+        self.assertEqual(counters, {'requests': 2, 'throttled': 1, 'errors': 0, 'short_circuited': 0})
+
+    @patch('tmdb_client.time.sleep')
+    def test_long_retry_after_is_not_waited_out(self, mock_sleep):
+        """A Retry-After beyond the cap returns the 429 to the caller immediately."""
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '120'})
+        with patch.object(self.client.session, 'get', return_value=throttled) as mock_get:
+            result = self.client.get('/search/movie', params={'query': 'Inception'})
+
+        self.assertEqual(result.status_code, 429)
+        self.assertEqual(mock_get.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    def test_token_bucket_limits_rate(self):
+        """Once the burst is spent, callers wait for tokens to refill."""
+        bucket = TokenBucket(rate=1000, burst=5)
+        with patch('tmdb_client.time.sleep') as mock_sleep:
+            for _ in range(5):
+                bucket.acquire()
+            mock_sleep.assert_not_called()
+            bucket.tokens = 0
+            bucket.updated = tmdb_client.time.monotonic() + 1  # Freeze the refill
+            mock_sleep.side_effect = lambda seconds: setattr(bucket, 'tokens', 1)
+            bucket.acquire()
+            mock_sleep.assert_called()
+
+    def test_adaptive_limit_shrinks_and_grows(self):
+        """Throttling and slow responses shrink the limit; fast responses grow it back."""
+        limit = AdaptiveConcurrencyLimit(initial=8, minimum=2, maximum=16, latency_target=1.0)
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 4)
+
+        limit.acquire()
+        limit.release(latency=5.0)
+        self.assertLess(limit.limit, 4)
+
+        limit.latency = None
+        shrunk = limit.limit
+        for _ in range(20):
+            limit.acquire()
+            limit.release(latency=0.1)
+        self.assertGreater(limit.limit, shrunk)
+
+
+class StatsRouteTestCase(unittest.TestCase):
+    """The client's internal counters are only exposed outside production."""
+
+    def test_stats_route_is_hidden_in_production(self):
+        from app import create_app
+        from config import TestingConfig, ProductionConfig
+
+        class LiveConfig(ProductionConfig):
+            SQLALCHEMY_DATABASE_URI = TestingConfig.SQLALCHEMY_DATABASE_URI
+            CACHE_TYPE = TestingConfig.CACHE_TYPE
+
+        self.assertEqual(create_app(TestingConfig).test_client().get('/tmdb/stats').status_code, 200)
+        self.assertEqual(create_app(LiveConfig, warm_cache=False).test_client().get('/tmdb/stats').status_code, 404)
+
+
+class ThrottledSearchTestCase(unittest.TestCase):
+    """A throttled search must not be cached as the real answer."""
+
+    @patch('tmdb_client.time.sleep')
+    @patch('tmdb_client.tmdb.session.get')
+    def test_throttled_search_is_not_cached(self, mock_get, mock_sleep):
+        from app import create_app
+        from config import TestingConfig
+        from utils import cache
+        from tmdb_helpers import search_movie
+        tmdb_client.tmdb.breaker.reset()
+
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {'results': [{'id': 1, 'title': 'Inception'}]}
+        mock_get.return_value = MagicMock(status_code=429, headers={'Retry-After': '60'})
+
+        with create_app(TestingConfig).app_context():
+            cache.clear()
+            self.assertEqual(search_movie('Inception'), [])
+
+            mock_get.return_value = ok
+            self.assertEqual([movie['title'] for movie in search_movie('Inception')], ['Inception'])
+            cache.clear()
+
+
+class SearchCacheTestCase(unittest.TestCase):
+    """Changing filters or the query's spelling must not repeat the TMDB searches."""
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_filters_run_on_cached_results(self, mock_get):
+        from app import create_app
+        from config import TestingConfig
+        from utils import cache
+        from tmdb_helpers import search_movie
+        tmdb_client.tmdb.breaker.reset()
+
+        titles = MagicMock(status_code=200)
+        titles.json.return_value = {'results': [
+            {'id': 1, 'title': 'Inception', 'vote_average': 8.4, 'release_date': '2010-07-15'},
+            {'id': 2, 'title': 'Inception: The Cobol Job', 'vote_average': 6.9, 'release_date': '2010-12-07'},
+        ]}
+        no_people = MagicMock(status_code=200)
+        no_people.json.return_value = {'results': []}
+        mock_get.side_effect = lambda url, **kwargs: titles if url.endswith('/search/movie') else no_people
+
+        with create_app(TestingConfig).app_context():
+            cache.clear()
+            search_movie('Inception')
+            calls = mock_get.call_count
+
+            by_title = search_movie('inception  movies', filters={'sort_by': 'title_desc'})
+            by_rating = search_movie('Inception', filters={'rating': '8'})
+
+            self.assertEqual(mock_get.call_count, calls)
+            self.assertEqual([movie['id'] for movie in by_title], [2, 1])
+            self.assertEqual([movie['id'] for movie in by_rating], [1])
+            # The cached entry itself is never filtered or re-sorted
+            self.assertEqual([movie['id'] for movie in search_movie('Inception')], [1, 2])
+            cache.clear()
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_empty_search_is_cached_briefly(self, mock_get):
+        from app import create_app
+        from config import TestingConfig
+        from utils import cache
+        from tmdb_helpers import search_movie, normalize_query, EMPTY_SEARCH_TIMEOUT
+        from hashlib import md5
+        tmdb_client.tmdb.breaker.reset()
+
+        empty = MagicMock(status_code=200)
+        empty.json.return_value = {'results': []}
+        mock_get.return_value = empty
+
+        with create_app(TestingConfig).app_context():
+            cache.clear()
+            self.assertEqual(search_movie('xqzzy'), [])
+            calls = mock_get.call_count
+            self.assertEqual(search_movie('xqzzy'), [])
+            self.assertEqual(mock_get.call_count, calls)
+
+            key = f"search_movie_{md5(normalize_query('xqzzy').encode()).hexdigest()}"
+            self.assertLessEqual(cache.get(key)['soft_expiry'], tmdb_client.time.time() + EMPTY_SEARCH_TIMEOUT)
+            cache.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
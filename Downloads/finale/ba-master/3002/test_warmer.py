@@ -0,0 +1,75 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from app import create_app
+from config import TestingConfig
+from utils import cache
+from warmer import warm_once
+from recommendation import get_recommended_movies
+
+app = create_app(TestingConfig)
+
+
+class CacheWarmerTestCase(unittest.TestCase):
+    """Test case for the refresh-ahead cache warmer."""
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        self.app_context.pop()
+
+    def test_missing_entries_are_prepopulated(self):
+        loader = MagicMock(return_value=[{'id': 1}])
+        refreshed = warm_once([('fetch_movies_top_rated', loader, 300, 86400)])
+
+        self.assertEqual(refreshed, ['fetch_movies_top_rated'])
+        self.assertEqual(cache.get('fetch_movies_top_rated')['value'], [{'id': 1}])
+
+    def test_only_entries_close_to_expiry_are_refreshed(self):
+        """Entries with plenty of soft TTL left are skipped; those about to expire are re-fetched."""
+        cache.set('fresh', {'value': ['old'], 'soft_expiry': time.time() + 250}, timeout=600)
+        cache.set('expiring', {'value': ['old'], 'soft_expiry': time.time() + 30}, timeout=600)
+        fresh_loader = MagicMock(return_value=['new'])
+        expiring_loader = MagicMock(return_value=['new'])
+
+        refreshed = warm_once([('fresh', fresh_loader, 300, 600), ('expiring', expiring_loader, 300, 600)], ahead=120)
+
+        self.assertEqual(refreshed, ['expiring'])
+        fresh_loader.assert_not_called()
+        self.assertEqual(cache.get('expiring')['value'], ['new'])
+        self.assertGreater(cache.get('expiring')['soft_expiry'], time.time() + 250)
+
+    def test_failed_refresh_keeps_current_entry(self):
+        cache.set('expiring', {'value': ['old'], 'soft_expiry': time.time() + 30}, timeout=600)
+        self.assertEqual(warm_once([('expiring', MagicMock(return_value=None), 300, 600)]), [])
+        self.assertEqual(cache.get('expiring')['value'], ['old'])
+
+
+    @patch('app.start_warmer')
+    def test_warmer_starts_when_the_app_is_created(self, mock_start):
+        class WarmConfig(TestingConfig):
+            TESTING = False
+
+        warm_app = create_app(WarmConfig)
+        mock_start.assert_called_once_with(warm_app)
+
+        create_app(WarmConfig, warm_cache=False)
+        create_app(TestingConfig)
+        self.assertEqual(mock_start.call_count, 1)
+
+
+    @patch('tmdb_client.tmdb.session.get')
+    def test_anonymous_recommendations_come_from_the_warm_list(self, mock_get):
+        trending = [{'id': 1, 'title': 'Trending'}]
+        warm_once([('fetch_movies_week', MagicMock(return_value=trending), 300, 86400)])
+
+        self.assertEqual(get_recommended_movies(MagicMock(is_authenticated=False)), trending)
+        mock_get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+from fixtures import AppTestCase, add_users
+from models import db, Review, UserMovies, MovieRatingStats, UserGenreProfile
+from writes import save_rating, add_to_list
+
+class WritesTestCase(AppTestCase):
+    """Test case for the upsert write path for ratings and list membership."""
+
+    def setUp(self):
+        super().setUp()
+        add_users(1, 2)
+        patcher = patch('writes.get_movie_details', return_value={'id': 10, 'genre_ids': [28, 878]})
+        self.mock_details = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stats(self, movie_id):
+        row = db.session.get(MovieRatingStats, movie_id)
+        return row.review_count, row.rating_sum
+
+    def test_rating_twice_updates_one_row_and_its_stats(self):
+        self.assertIsNone(save_rating(1, 10, 3, review_text="Fine"))
+        self.assertEqual(save_rating(1, 10, 5), 3)
+        save_rating(2, 10, 4)
+
+        reviews = Review.query.filter_by(movie_id=10).order_by(Review.user_id).all()
+        self.assertEqual([(review.user_id, review.rating) for review in reviews], [(1, 5), (2, 4)])
+        self.assertEqual(reviews[0].review_text, "Fine")  # A bare rating leaves the text alone
+        self.assertEqual(self.stats(10), (2, 9))
+
+        save_rating(1, 10, 2, review_text=None)
+        self.assertIsNone(db.session.get(Review, reviews[0].id).review_text)
+        self.assertEqual(self.stats(10), (2, 6))
+
+    def test_rating_recomputes_the_movie_stats(self):
+        save_rating(1, 10, 3)
+        db.session.query(MovieRatingStats).update({'review_count': 7, 'rating_sum': 99})
+        db.session.commit()
+        save_rating(2, 10, 4)
+        self.assertEqual(self.stats(10), (2, 7))
+
+    def test_genre_profile_changes_in_the_same_transaction(self):
+        db.session.add(UserGenreProfile(user_id=1, genre_counts={'28': 1}))
+        db.session.commit()
+
+        save_rating(1, 10, 5)
+        self.assertEqual(db.session.get(UserGenreProfile, 1).genre_counts, {'28': 2, '878': 1})
+        save_rating(1, 10, 1)
+        self.assertEqual(db.session.get(UserGenreProfile, 1).genre_counts, {'28': 1})
+
+    def test_failed_write_leaves_review_and_stats_untouched(self):
+        save_rating(1, 10, 3)
+        with patch('writes.apply_genre_profile_change', side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                save_rating(1, 10, 5)
+        self.assertEqual(Review.query.one().rating, 3)
+        self.assertEqual(self.stats(10), (1, 3))
+
+    def test_list_membership_is_added_once(self):
+        self.assertTrue(add_to_list(1, 10, 'watchlist'))
+        self.assertFalse(add_to_list(1, 10, 'watchlist'))
+        self.assertTrue(add_to_list(1, 10, 'favorites'))
+        self.assertEqual(UserMovies.query.count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,12 @@
 import unittest
-from app import app, db
+from app import create_app, db
+from config import TestingConfig
 from models import User
 
 class AuthTestCase(unittest.TestCase):
     def setUp(self):
         """Set up the test environment."""
-        self.app = app
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # In-memory database for testing
+        self.app = create_app(TestingConfig)  # Build an isolated app on an in-memory database
         self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
         self.app.testing = True
         self.client = self.app.test_client()
@@ -0,0 +1,228 @@
+# tiered_cache.py
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask_caching.backends.base import BaseCache
+
+# Tier 1: per-process LRU bounded by the pickled size of its entries
+DEFAULT_MEMORY_LIMIT = 32 * 1024 * 1024  # Bytes
+# Tier 1 entries are re-read from the shared tier after this long so workers see each other's writes;
+# deletes and clears reach every worker at once through the shared generation counter
+DEFAULT_LOCAL_TIMEOUT = 30  # Seconds
+# Expired rows in the shared tier are purged every this many writes
+PURGE_EVERY = 500
+
+
+class TieredCache(BaseCache):
+    """
+    Two-tier cache backend for Flask-Caching.
+
+    Reads go to a small in-process LRU first and fall back to a SQLite file shared by every
+    worker on the host; writes go to both. Values are pickled once, and the pickled size is
+    what counts against `memory_limit`. Enable with CACHE_TYPE='tiered_cache.TieredCache'.
+
+    Every delete or clear bumps a generation counter in the shared file, and local copies
+    taken under an older generation are dropped, so an invalidation in one worker is seen
+    by all of them on their next read rather than after `local_timeout`.
+    """
+
+    def __init__(self, path, memory_limit=DEFAULT_MEMORY_LIMIT, local_timeout=DEFAULT_LOCAL_TIMEOUT,
+                 default_timeout=300, ignore_delete_many_errors=False):
+        super().__init__(default_timeout=default_timeout, ignore_delete_many_errors=ignore_delete_many_errors)
+        self.path = path
+        self.memory_limit = memory_limit
+        self.local_timeout = local_timeout
+        self._local = OrderedDict()  # key -> (expires_at, pickled value, generation)
+        self._local_bytes = 0
+        self._lock = threading.RLock()
+        self._connections = threading.local()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0)')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config.get('CACHE_TIERED_PATH') or os.path.join(app.instance_path, 'cache.db'),
+            memory_limit=config.get('CACHE_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT),
+            local_timeout=config.get('CACHE_LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT),
+        )
+        return cls(*args, **kwargs)
+
+    # --------------------- Shared tier ---------------------
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections cannot be shared across threads."""
+        conn = getattr(self._connections, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._connections.conn = conn
+        return conn
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return 0 if timeout == 0 else time.time() + timeout
+
+    def _generation(self):
+        """The shared invalidation counter, or None if the shared tier cannot be read."""
+        try:
+            return self._conn().execute('SELECT value FROM generation WHERE id = 0').fetchone()[0]
+        except (sqlite3.Error, TypeError):
+            return None
+
+    def _bump_generation(self):
+        self._conn().execute('UPDATE generation SET value = value + 1 WHERE id = 0')
+
+    def _purge_expired(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self._conn().execute('DELETE FROM cache WHERE expires_at != 0 AND expires_at <= ?', (time.time(),))
+
+    # --------------------- Local tier ---------------------
+
+    def _local_get(self, key):
+        with self._lock:
+            if key not in self._local:
+                return None
+        # Outside the lock: one primary-key read of the shared counter
+        generation = self._generation()
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time() or generation is None or item[2] != generation:
+                self._local_discard(key)
+                return None
+            self._local.move_to_end(key)
+            return item[1]
+
+    def _local_set(self, key, blob, expires_at, generation):
+        # Never hold a local copy past the shared entry's expiry or the local refresh window
+        local_expiry = time.time() + self.local_timeout
+        if expires_at:
+            local_expiry = min(local_expiry, expires_at)
+        with self._lock:
+            self._local_discard(key)
+            if generation is None or len(blob) > self.memory_limit:
+                return
+            self._local[key] = (local_expiry, blob, generation)
+            self._local_bytes += len(blob)
+            while self._local_bytes > self.memory_limit:
+                _, (_, evicted, _) = self._local.popitem(last=False)
+                self._local_bytes -= len(evicted)
+
+    def _local_discard(self, key):
+        with self._lock:
+            item = self._local.pop(key, None)
+            if item is not None:
+                self._local_bytes -= len(item[1])
+
+    # --------------------- Cache API ---------------------
+
+    def get(self, key):
+        blob = self._local_get(key)
+        if blob is None:
+            # Read the generation first, so a delete racing with this read invalidates the copy
+            generation = self._generation()
+            try:
+                row = self._conn().execute(
+                    'SELECT value, expires_at FROM cache WHERE key = ? AND (expires_at = 0 OR expires_at > ?)',
+                    (key, time.time())
+                ).fetchone()
+            except sqlite3.Error as e:
+                logging.warning(f"Shared cache read of {key} failed: {e}")
+                return None
+            if row is None:
+                return None
+            blob, expires_at = row
+            self._local_set(key, blob, expires_at, generation)
+        try:
+            return pickle.loads(blob)
+        except (pickle.PickleError, EOFError, AttributeError, ImportError):
+            return None
+
+    def set(self, key, value, timeout=None):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires_at = self._expires_at(timeout)
+        generation = self._generation()
+        try:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)', (key, blob, expires_at)
+            )
+            self._purge_expired()
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache write of {key} failed: {e}")
+            self._local_discard(key)
+            return False
+        self._local_set(key, blob, expires_at, generation)
+        return True
+
+    def add(self, key, value, timeout=None):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires_at = self._expires_at(timeout)
+        generation = self._generation()
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM cache WHERE key = ? AND expires_at != 0 AND expires_at <= ?',
+                             (key, time.time()))
+                added = conn.execute(
+                    'INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)', (key, blob, expires_at)
+                ).rowcount == 1
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache add of {key} failed: {e}")
+            return False
+        if added:
+            self._local_set(key, blob, expires_at, generation)
+        return added
+
+    def delete(self, key):
+        self._local_discard(key)
+        try:
+            deleted = self._conn().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+            # Other workers drop their local copies on their next read
+            self._bump_generation()
+            return deleted
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache delete of {key} failed: {e}")
+            return False
+
+    def has(self, key):
+        if self._local_get(key) is not None:
+            return True
+        try:
+            return self._conn().execute(
+                'SELECT 1 FROM cache WHERE key = ? AND (expires_at = 0 OR expires_at > ?)', (key, time.time())
+            ).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+        try:
+            self._conn().execute('DELETE FROM cache')
+            self._bump_generation()
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache clear failed: {e}")
+            return False
+        return True
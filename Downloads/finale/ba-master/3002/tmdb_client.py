@@ -0,0 +1,299 @@
+# tmdb_client.py
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_KEY = os.environ.get('TMDB_API_KEY', '9ba93d1cf5e3054788a377f636ea1033')
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+
+# Connection pool sizing (one keep-alive pool shared by every worker thread)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = int(os.environ.get('TMDB_POOL_MAXSIZE', 20))
+
+# Per-endpoint (connect timeout, read timeout) in seconds and number of retries
+DEFAULT_POLICY = ((3.05, 10), 2)
+ENDPOINT_POLICIES = {
+    '/movie/{id}': ((3.05, 5), 2),
+    '/movie/{id}/credits': ((3.05, 5), 2),
+    '/movie/{id}/recommendations': ((3.05, 5), 1),
+    '/search/movie': ((3.05, 4), 1),
+    '/search/person': ((3.05, 4), 1),
+    '/person/{id}/movie_credits': ((3.05, 5), 1),
+    '/movie/top_rated': ((3.05, 8), 2),
+    '/movie/now_playing': ((3.05, 8), 2),
+    '/trending/movie/week': ((3.05, 8), 2),
+    '/genre/movie/list': ((3.05, 10), 2),
+    '/configuration/languages': ((3.05, 10), 2),
+}
+
+# Upstream statuses that are worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.3  # Seconds, doubled on every attempt
+
+# Process-wide outbound budget (TMDB allows roughly 50 requests per second per IP)
+RATE_LIMIT = float(os.environ.get('TMDB_RATE_LIMIT', 40))  # Requests per second
+RATE_BURST = int(os.environ.get('TMDB_RATE_BURST', 40))
+MAX_RETRY_AFTER = 5  # Longest Retry-After we are willing to sleep through inside a request
+
+# Adaptive concurrency: the in-flight limit shrinks when TMDB latency rises above the target
+CONCURRENCY_MIN = 2
+CONCURRENCY_INITIAL = 8
+LATENCY_TARGET = 1.0  # Seconds (smoothed)
+
+# Circuit breaker: stop calling TMDB after this many consecutive failed requests,
+# then let a single probe through once the cool-down has passed
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30  # Seconds
+
+
+def endpoint_name(path):
+    """Collapses numeric path segments so '/movie/550/credits' becomes '/movie/{id}/credits'."""
+    if path.startswith(TMDB_BASE_URL):
+        path = path[len(TMDB_BASE_URL):]
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every outbound TMDB request in the process."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on in-flight TMDB requests: it grows by roughly one slot per window of healthy
+    responses and shrinks multiplicatively when smoothed latency exceeds the target or TMDB throttles us.
+    """
+
+    def __init__(self, initial=CONCURRENCY_INITIAL, minimum=CONCURRENCY_MIN, maximum=POOL_MAXSIZE,
+                 latency_target=LATENCY_TARGET):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.latency = None
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if self.latency > self.latency_target:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down -> closed on success."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.probing else 'open'
+
+    def allow(self):
+        """Returns True if a request may go out now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.probing = True  # Exactly one probe while half-open
+                return True
+            return False
+
+    def record_success(self):
+        self.reset()
+
+    def reset(self):
+        """Closes the breaker."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    logging.error(f"TMDB circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class TmdbClient:
+    """Thread-safe, rate-limited TMDB client backed by a single keep-alive connection pool."""
+
+    def __init__(self, api_key=API_KEY, base_url=TMDB_BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.bucket = TokenBucket()
+        self.concurrency = AdaptiveConcurrencyLimit()
+        self.breaker = CircuitBreaker()
+        self._counters = defaultdict(lambda: {'requests': 0, 'throttled': 0, 'errors': 0, 'short_circuited': 0})
+        self._counters_lock = threading.Lock()
+
+    def _count(self, endpoint, counter):
+        with self._counters_lock:
+            self._counters[endpoint][counter] += 1
+
+    def stats(self):
+        """Returns per-endpoint request, throttled (HTTP 429), error and short-circuit counters plus limiter state."""
+        with self._counters_lock:
+            endpoints = {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+        return {
+            'endpoints': endpoints,
+            'concurrency_limit': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'latency': self.concurrency.latency,
+            'circuit': self.breaker.state
+        }
+
+    def _send(self, endpoint, url, query, timeout):
+        """Sends one request through the token bucket and the adaptive concurrency limit."""
+        self.bucket.acquire()
+        self.concurrency.acquire()
+        self._count(endpoint, 'requests')
+        started = time.monotonic()
+        response = None
+        try:
+            response = self.session.get(url, params=query, timeout=timeout)
+            return response
+        finally:
+            # Timeouts and connection errors count towards latency as well
+            throttled = response is not None and response.status_code == 429
+            self.concurrency.release(latency=time.monotonic() - started, throttled=throttled)
+
+    def get(self, path, params=None):
+        """
+        Issues a GET request against a TMDB endpoint, e.g. get('/movie/550', {'language': 'en-US'}).
+        Returns the final response, or None if TMDB could not be reached within the retry budget
+        or the circuit breaker is open.
+        """
+        endpoint = endpoint_name(path)
+        if not self.breaker.allow():
+            self._count(endpoint, 'short_circuited')
+            return None
+
+        try:
+            response = self._get_with_retries(endpoint, path, params)
+        except Exception:
+            # Anything unexpected still settles the breaker, or a failed half-open probe would block TMDB for good
+            self.breaker.record_failure()
+            raise
+        # Server errors and unreachable upstreams trip the breaker; 4xx answers (incl. 429) do not
+        if response is None or response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _get_with_retries(self, endpoint, path, params):
+        timeout, retries = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        query = {'api_key': self.api_key}
+        if params:
+            query.update(params)
+
+        response = None
+        for attempt in range(retries + 1):
+            delay = RETRY_BACKOFF * (2 ** attempt)
+            try:
+                response = self._send(endpoint, url, query, timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                logging.warning(f"TMDB {endpoint} returned {response.status_code} (attempt {attempt + 1})")
+                if response.status_code == 429:
+                    self._count(endpoint, 'throttled')
+                    retry_after = retry_after_seconds(response)
+                    if retry_after is not None:
+                        if retry_after > MAX_RETRY_AFTER:
+                            # Not worth holding the request open; let the caller fall back
+                            return response
+                        delay = retry_after
+            except requests.RequestException as e:
+                response = None
+                self._count(endpoint, 'errors')
+                logging.warning(f"TMDB {endpoint} request failed (attempt {attempt + 1}): {e}")
+
+            if attempt < retries:
+                time.sleep(delay)
+
+        return response
+
+    def get_json(self, path, params=None):
+        """Returns the decoded JSON body of a successful request, or None."""
+        response = self.get(path, params)
+        if response is not None and response.status_code == 200:
+            return response.json()
+        return None
+
+
+# Shared client used by every module that talks to TMDB
+tmdb = TmdbClient()
@@ -1,13 +1,13 @@
 # tmdb_helpers.py
 
-import requests
-import os
 from utils import cache  # Import the cache instance from app.py
+from tmdb_client import tmdb
+from swr import get_or_fetch, Negative, Uncacheable
+from catalogue import save_list_entries
+from functools import partial
 from hashlib import md5
 import logging
-
-API_KEY = os.environ.get('TMDB_API_KEY', '9ba93d1cf5e3054788a377f636ea1033')
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+import os
 
 # Configure logging to write to a file
 logging.basicConfig(
@@ -19,87 +19,123 @@ logging.basicConfig(
     ]
 )
 
-@cache.cached(timeout=300, key_prefix='top_rated_movies')
+# Stale-while-revalidate windows (seconds): served fresh until the soft timeout,
+# refreshed in the background until the hard timeout, then dropped
+LIST_SOFT_TIMEOUT = 300
+LIST_HARD_TIMEOUT = 86400
+SEARCH_SOFT_TIMEOUT = 3600
+SEARCH_HARD_TIMEOUT = 86400
+EMPTY_SEARCH_TIMEOUT = int(os.environ.get('EMPTY_SEARCH_TIMEOUT', 120))  # Searches with no results
+REFERENCE_SOFT_TIMEOUT = 86400  # Genres and languages rarely change
+REFERENCE_HARD_TIMEOUT = 7 * 86400
+
 def get_top_rated_movies():
-    url = f'{TMDB_BASE_URL}/movie/top_rated'
-    return fetch_movies(url)
+    return fetch_movies('/movie/top_rated')
 
-@cache.cached(timeout=300, key_prefix='new_released_movies')
 def get_new_released_movies():
-    url = f'{TMDB_BASE_URL}/movie/now_playing'
-    return fetch_movies(url)
+    return fetch_movies('/movie/now_playing')
 
-@cache.cached(timeout=300, key_prefix='trending_movies')
 def get_trending_movies():
-    url = f'{TMDB_BASE_URL}/trending/movie/week'
-    return fetch_movies(url)
+    return fetch_movies('/trending/movie/week')
 
-@cache.cached(timeout=86400, key_prefix='movie_genres')
 def get_genres():
-    url = f'{TMDB_BASE_URL}/genre/movie/list'
-    params = {'api_key': API_KEY, 'language': 'en-US'}
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        return response.json().get('genres', [])
-    return []
+    genres = get_or_fetch('movie_genres', _load_genres, REFERENCE_SOFT_TIMEOUT, REFERENCE_HARD_TIMEOUT)
+    return genres if genres is not None else []
 
-@cache.memoize(timeout=3600)
+def _load_genres():
+    response = tmdb.get('/genre/movie/list', params={'language': 'en-US'})
+    if response is not None and response.status_code == 200:
+        return response.json().get('genres', [])
+    return None
+
+def get_languages():
+    """Fetches supported languages from the TMDB API and sorts them alphabetically by name."""
+    languages = get_or_fetch('languages', _load_languages, REFERENCE_SOFT_TIMEOUT, REFERENCE_HARD_TIMEOUT)
+    return languages if languages is not None else []
+
+def _load_languages():
+    response = tmdb.get('/configuration/languages')
+    if response is not None and response.status_code == 200:
+        languages = response.json()
+        # Filter out languages without a proper iso_639_1 code and sort alphabetically by 'english_name'
+        return sorted(
+            [
+                {"code": lang['iso_639_1'], "name": lang['english_name']}
+                for lang in languages
+                if lang.get('iso_639_1') and lang.get('english_name')
+            ],
+            key=lambda x: x["name"]
+        )
+    return None
+
+# Failed lookups return None, which is never memoized
+@cache.memoize(timeout=3600, response_filter=lambda movies: movies is not None)
 def search_actor_movies(actor_name):
-    actor_url = f'{TMDB_BASE_URL}/search/person'
-    params = {'api_key': API_KEY, 'language': 'en-US', 'query': actor_name, 'include_adult': False}
-    response = requests.get(actor_url, params=params)
-    if response.status_code != 200:
-        return []
+    params = {'language': 'en-US', 'query': actor_name, 'include_adult': False}
+    response = tmdb.get('/search/person', params=params)
+    if response is None or response.status_code != 200:
+        return None
 
     actor_movie_results = []
     actors = response.json().get('results', [])
     for actor in actors:
         person_id = actor.get('id')
         if person_id:
-            credits_url = f'{TMDB_BASE_URL}/person/{person_id}/movie_credits'
-            credits_response = requests.get(credits_url, params=params)
-            if credits_response.status_code == 200:
-                credits = credits_response.json().get('cast', [])
-                actor_movie_results += process_movie_results(credits)
+            credits_response = tmdb.get(f'/person/{person_id}/movie_credits', params=params)
+            if credits_response is None or credits_response.status_code != 200:
+                return None
+            credits = credits_response.json().get('cast', [])
+            actor_movie_results += process_movie_results(credits)
 
     unique_movies = {movie['id']: movie for movie in actor_movie_results}
     return list(unique_movies.values())
-@cache.memoize(timeout=3600)  # Cache each unique search for 1 hour
-def search_movie(query, filters=None):
-    # Clean query
+
+def normalize_query(query):
+    """Drops the words 'movie'/'movies', lowercases and collapses whitespace so equivalent searches share a cache entry."""
     keywords_to_remove = ["movies", "movie"]
+    query = query.lower()
     for keyword in keywords_to_remove:
-        query = query.replace(keyword, "").strip()
+        query = query.replace(keyword, "")
+    return " ".join(query.split())
 
-    # Create a unique cache key for each query and filter combination
-    filter_str = str(filters) if filters else ""
-    cache_key = f"search_movie_{md5((query + filter_str).encode()).hexdigest()}"
-    
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        logging.info(f"Using cached results for search: {query} with filters: {filters}")
-        return cached_result
+def search_movie(query, filters=None):
+    query = normalize_query(query)
+
+    # One entry per query holds the raw merged results; filters and sorting run on top of it
+    cache_key = f"search_movie_{md5(query.encode()).hexdigest()}"
+    results = get_or_fetch(cache_key, partial(_load_search, query), SEARCH_SOFT_TIMEOUT, SEARCH_HARD_TIMEOUT)
+    if results is None:
+        return []
+
+    # Filter a copy; apply_filters sorts in place
+    return apply_filters(list(results), filters) if filters else results
 
+def _load_search(query):
+    """Runs the title and actor searches; partial results after a failure are returned but not cached."""
     # Fetch movie search results
-    movie_search_url = f'{TMDB_BASE_URL}/search/movie'
-    params = {'api_key': API_KEY, 'language': 'en-US', 'query': query, 'include_adult': False}
-    response = requests.get(movie_search_url, params=params)
+    params = {'language': 'en-US', 'query': query, 'include_adult': False}
+    response = tmdb.get('/search/movie', params=params)
     
     # Process results if response is successful
-    title_results = process_movie_results(response.json().get('results', [])) if response.status_code == 200 else []
+    title_ok = response is not None and response.status_code == 200
+    title_results = process_movie_results(response.json().get('results', [])) if title_ok else []
     
     # Fetch character results if available
     character_results = search_actor_movies(query)
-    combined_results = {movie['id']: movie for movie in title_results + character_results}
+    upstream_failed = not title_ok or character_results is None
+    combined_results = {movie['id']: movie for movie in title_results + (character_results or [])}
     unique_movies = list(combined_results.values())
 
-    # Apply filters (if any)
-    if filters:
-        unique_movies = apply_filters(unique_movies, filters)
+    # Throttled or failed lookups are served but never cached as the real answer
+    if upstream_failed:
+        logging.warning(f"Not caching search results for {query}: TMDB request failed or was throttled")
+        return Uncacheable(unique_movies)
 
-    # Cache the final filtered results
-    cache.set(cache_key, unique_movies, timeout=3600)  # 1-hour cache
-    logging.info(f"Cached search results for {query} with filters {filters}")
+    if not unique_movies:
+        logging.info(f"No results for {query}, caching for {EMPTY_SEARCH_TIMEOUT}s")
+        return Negative([], EMPTY_SEARCH_TIMEOUT)
+
+    logging.info(f"Cached search results for {query}")
     return unique_movies
 
 def apply_filters(movies, filters):
@@ -141,24 +177,25 @@ def apply_filters(movies, filters):
 
     return movies
 
-def fetch_movies(url):
-    # Cache based on URL
-    cache_key = f"fetch_movies_{url.split('/')[-1]}"
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        logging.info(f"Using cached data for {url}")
-        return cached_data
+def fetch_movies(path):
+    # Cache based on the endpoint path; stale lists are served while a background refresh runs
+    movies = get_or_fetch(list_cache_key(path), partial(_load_movies, path), LIST_SOFT_TIMEOUT, LIST_HARD_TIMEOUT)
+    return movies if movies is not None else []
 
-    params = {'api_key': API_KEY, 'language': 'en-US', 'page': 1}
-    response = requests.get(url, params=params)
+def list_cache_key(path):
+    return f"fetch_movies_{path.split('/')[-1]}"
+
+def _load_movies(path):
+    """Fetches a movie list from TMDB; returns None if TMDB cannot be reached."""
+    params = {'language': 'en-US', 'page': 1}
+    response = tmdb.get(path, params=params)
     
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         movies = process_movie_results(response.json().get('results', []))
-        cache.set(cache_key, movies, timeout=300)  # Cache for 5 minutes
+        save_list_entries(movies)
         return movies
     
-    return []
+    return None
 
 def process_movie_results(results):
     movies = []
@@ -174,3 +211,12 @@ def process_movie_results(results):
             'backdrop': f"https://image.tmdb.org/t/p/original{movie['backdrop_path']}" if movie.get('backdrop_path') else "https://via.placeholder.com/1280x720?text=No+Image"
         })
     return movies
+
+# Entries kept warm by the background refresher: (cache key, loader, soft timeout, hard timeout)
+MOVIE_LISTS = ['/movie/top_rated', '/movie/now_playing', '/trending/movie/week']
+WARM_TARGETS = [
+    (list_cache_key(path), partial(_load_movies, path), LIST_SOFT_TIMEOUT, LIST_HARD_TIMEOUT) for path in MOVIE_LISTS
+] + [
+    ('movie_genres', _load_genres, REFERENCE_SOFT_TIMEOUT, REFERENCE_HARD_TIMEOUT),
+    ('languages', _load_languages, REFERENCE_SOFT_TIMEOUT, REFERENCE_HARD_TIMEOUT),
+]
@@ -1,115 +1,136 @@
 # utils.py
 from flask import Flask 
-import requests
+from extensions import cache
+from tmdb_client import tmdb
+from fanout import with_app_context
+from swr import get_or_fetch, serve, store, refresh_in_background, Negative, Uncacheable
+from catalogue import get_catalogued, is_fresh, save_details
+from rating_stats import avg_ratings, NO_RATINGS
+from concurrent.futures import ThreadPoolExecutor
 import os
-from models import Review
-from flask_caching import Cache
 
-cache = Cache()
+from functools import partial
 
-API_KEY = os.environ.get('TMDB_API_KEY', '9ba93d1cf5e3054788a377f636ea1033')
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+# Bounded pool for fetching movie details that miss the cache
+DETAILS_MAX_WORKERS = int(os.environ.get('DETAILS_MAX_WORKERS', 8))
+details_executor = ThreadPoolExecutor(max_workers=DETAILS_MAX_WORKERS, thread_name_prefix='movie-details')
+
+# Movie details are refreshed in the background after a day and dropped after a week
+DETAILS_SOFT_TIMEOUT = 86400
+DETAILS_HARD_TIMEOUT = 7 * 86400
+# Movies TMDB answers 404 for (bad or deleted IDs) are remembered this long
+MISSING_MOVIE_TIMEOUT = int(os.environ.get('MISSING_MOVIE_TIMEOUT', 600))
 
 def get_movie_details(movie_id):
     """
     Fetch detailed information for a specific movie, including main characters and director, with caching.
+    Details and credits come back in a single TMDB request and are cached as one compact entry.
+    Stale entries are served immediately while a background refresh runs.
     """
-    # Define unique cache keys for movie details and credits
-    cache_key_movie = f"movie_details_{movie_id}"
-    cache_key_credits = f"movie_credits_{movie_id}"
-
-    # Try to retrieve cached movie details
-    movie = cache.get(cache_key_movie)
-    if not movie:
-        url = f'{TMDB_BASE_URL}/movie/{movie_id}'
-        params = {'api_key': API_KEY, 'language': 'en-US'}
-        response = requests.get(url, params=params)
-
-        if response.status_code == 200:
-            movie = response.json()
-            movie['rating'] = movie.get('vote_average', 'N/A')
-
-            # Handle poster and backdrop images
-            poster_path = movie.get('poster_path')
-            movie['poster'] = f"https://image.tmdb.org/t/p/original{poster_path}" if poster_path else "https://via.placeholder.com/500x750?text=No+Image"
-            backdrop_path = movie.get('backdrop_path')
-            movie['backdrop'] = f"https://image.tmdb.org/t/p/original{backdrop_path}" if backdrop_path else "https://via.placeholder.com/1280x720?text=No+Image"
-
-            # Include original_language and genre IDs for filtering
-            movie['original_language'] = movie.get('original_language', 'N/A')
-            movie['genre_ids'] = [genre['id'] for genre in movie.get('genres', [])]
-
-            # Cache movie details for 1 day
-            cache.set(cache_key_movie, movie, timeout=86400)  # Cache for 1 day
+    cache_key = f"movie_details_{movie_id}"
+    return get_or_fetch(cache_key, partial(_load_movie_details, movie_id), DETAILS_SOFT_TIMEOUT, DETAILS_HARD_TIMEOUT)
+
+def _load_movie_details(movie_id):
+    """Reads a movie from the local catalogue, falling back to TMDB when the row is missing or stale."""
+    movie = get_catalogued([movie_id]).get(movie_id)
+    if movie is not None and is_fresh(movie):
+        return movie.to_dict()
+
+    params = {'language': 'en-US', 'append_to_response': 'credits'}
+    response = tmdb.get(f'/movie/{movie_id}', params=params)
+    if response is not None and response.status_code == 200:
+        details = compact_movie_details(response.json())
+        save_details([details])
+        return details
+    if response is not None and response.status_code == 404:
+        # TMDB doesn't know this ID; cache the miss briefly so crawlers can't burn our quota
+        return Negative(None, MISSING_MOVIE_TIMEOUT)
+    if movie is not None:
+        # TMDB is unavailable: serve the stale row, but don't cache it so the next read retries
+        return Uncacheable(movie.to_dict())
+    return None
+
+def get_movie_details_many(movie_ids):
+    """
+    Fetch details for a list of movies, returned in input order (None for movies TMDB doesn't know).
+    IDs are deduplicated, cached entries and catalogue rows each come from one bulk lookup,
+    and only movies missing from both are fetched from TMDB concurrently.
+    """
+    unique_ids = list(dict.fromkeys(movie_ids))
+    if not unique_ids:
+        return []
+
+    keys = [f"movie_details_{movie_id}" for movie_id in unique_ids]
+    details = {}
+    for movie_id, key, entry in zip(unique_ids, keys, cache.get_many(*keys)):
+        if entry is not None:
+            details[movie_id] = serve(key, entry, partial(_load_movie_details, movie_id),
+                                      DETAILS_SOFT_TIMEOUT, DETAILS_HARD_TIMEOUT)
+
+    # Cache misses are served from the catalogue; stale rows are refreshed in the background
+    misses = [movie_id for movie_id in unique_ids if movie_id not in details]
+    for movie_id, movie in get_catalogued(misses).items():
+        key = f"movie_details_{movie_id}"
+        details[movie_id] = movie.to_dict()
+        if is_fresh(movie):
+            store(key, details[movie_id], DETAILS_SOFT_TIMEOUT, DETAILS_HARD_TIMEOUT)
         else:
-            return None
-
-    # Try to retrieve cached credits
-    credits = cache.get(cache_key_credits)
-    if not credits:
-        credits_url = f'{TMDB_BASE_URL}/movie/{movie_id}/credits'
-        params = {'api_key': API_KEY}
-        credits_response = requests.get(credits_url, params=params)
-
-        if credits_response.status_code == 200:
-            credits = credits_response.json()
-
-            # Cache credits data for 1 day
-            cache.set(cache_key_credits, credits, timeout=86400)
-
-    if credits:
-        # Extract director's name
-        director = next((member['name'] for member in credits.get('crew', []) if member.get('job') == 'Director'), "Not Available")
-        movie['director'] = director
-
-        # Extract main characters (first 5 actors)
-        main_cast = [member['name'] for member in credits.get('cast', [])[:5]]
-        movie['main_characters'] = main_cast if main_cast else ["No main characters available"]
-
-    return movie
+            refresh_in_background(key, partial(_load_movie_details, movie_id), DETAILS_SOFT_TIMEOUT, DETAILS_HARD_TIMEOUT)
+
+    misses = [movie_id for movie_id in misses if movie_id not in details]
+    if len(misses) == 1:
+        details[misses[0]] = get_movie_details(misses[0])
+    elif misses:
+        fetch = with_app_context(get_movie_details)
+        details.update(zip(misses, details_executor.map(fetch, misses)))
+
+    return [details.get(movie_id) for movie_id in movie_ids]
+
+def compact_movie_details(data):
+    """Reduces a TMDB movie (with appended credits) to the fields our pages and recommenders use."""
+    credits = data.get('credits') or {}
+
+    # Extract director's name and main characters (first 5 actors)
+    director = next((member['name'] for member in credits.get('crew', []) if member.get('job') == 'Director'), "Not Available")
+    main_cast = [member['name'] for member in credits.get('cast', [])[:5]]
+
+    poster_path = data.get('poster_path')
+    backdrop_path = data.get('backdrop_path')
+    genres = [{'id': genre['id'], 'name': genre['name']} for genre in data.get('genres', [])]
+
+    return {
+        'id': data.get('id'),
+        'title': data.get('title', 'No Title'),
+        'overview': data.get('overview', ''),
+        'release_date': data.get('release_date', 'N/A'),
+        'rating': data.get('vote_average', 'N/A'),
+        'original_language': data.get('original_language', 'N/A'),
+        'genres': genres,
+        'genre_ids': [genre['id'] for genre in genres],
+        'director': director,
+        'main_characters': main_cast if main_cast else ["No main characters available"],
+        'poster': f"https://image.tmdb.org/t/p/original{poster_path}" if poster_path else "https://via.placeholder.com/500x750?text=No+Image",
+        'backdrop': f"https://image.tmdb.org/t/p/original{backdrop_path}" if backdrop_path else "https://via.placeholder.com/1280x720?text=No+Image"
+    }
 
 def calculate_avg_rating(movie_id):
-    """Calculates the average rating for a movie based on user reviews."""
-    reviews = Review.query.filter_by(movie_id=movie_id).all()
-    if reviews:
-        avg_rating = sum([review.rating for review in reviews]) / len(reviews)
-        return round(avg_rating, 1)
-    return "No ratings yet"
-
-def get_similar_movie_ratings(recommendations):
-    """Calculates average rating for each movie in the recommendations."""
+    """Returns the average user rating for a movie from the ratings summary table."""
+    return avg_ratings([movie_id]).get(movie_id, NO_RATINGS)
+
+def get_similar_movie_ratings(recommendations, averages=None):
+    """
+    Adds the average user rating to each movie in the recommendations.
+    All averages come from one query unless the caller already fetched them with avg_ratings.
+    """
+    if averages is None:
+        averages = avg_ratings([movie['id'] for movie in recommendations])
     for movie in recommendations:
-        movie['average_rating'] = calculate_avg_rating(movie['id'])
+        movie['average_rating'] = averages.get(movie['id'], NO_RATINGS)
     return recommendations
 
-def get_movie_recommendations(movie_title):
-    """Fetches recommendations based on a specific movie title."""
-    search_url = f'{TMDB_BASE_URL}/search/movie'
-    search_params = {
-        'api_key': API_KEY,
-        'language': 'en-US',
-        'query': movie_title,
-        'page': 1,
-        'include_adult': False
-    }
-    search_response = requests.get(search_url, params=search_params)
-    if search_response.status_code == 200:
-        search_results = search_response.json().get('results', [])
-        if search_results:
-            movie_id = search_results[0]['id']
-            recommendations_url = f'{TMDB_BASE_URL}/movie/{movie_id}/recommendations'
-            rec_params = {
-                'api_key': API_KEY,
-                'language': 'en-US',
-                'page': 1
-            }
-            rec_response = requests.get(recommendations_url, params=rec_params)
-            return process_movie_results(rec_response)
-    return []
-
 def process_movie_results(response):
     """Processes movie results from TMDB API responses to include images and ratings."""
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         results = response.json().get('results', [])
         for movie in results:
             movie['rating'] = movie.get('vote_average', 'N/A')
@@ -0,0 +1,63 @@
+# warmer.py
+
+import logging
+import os
+import threading
+from swr import expires_within, reload
+from tmdb_helpers import WARM_TARGETS
+
+# How often the warmer wakes up, and how long before an entry's soft expiry it is re-fetched.
+# REFRESH_AHEAD must exceed WARM_INTERVAL so lists are replaced before they ever go stale.
+WARM_INTERVAL = int(os.environ.get('WARM_INTERVAL', 60))  # Seconds
+REFRESH_AHEAD = int(os.environ.get('WARM_REFRESH_AHEAD', 120))  # Seconds
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def warm_once(targets=None, ahead=REFRESH_AHEAD):
+    """Re-fetches every target that is missing or about to pass its soft TTL. Returns the keys refreshed."""
+    refreshed = []
+    for key, loader, soft_timeout, hard_timeout in targets or WARM_TARGETS:
+        if not expires_within(key, ahead):
+            continue
+        try:
+            if reload(key, loader, soft_timeout, hard_timeout) is not None:
+                refreshed.append(key)
+            else:
+                logging.warning(f"Cache warmer could not refresh {key}, will retry in {WARM_INTERVAL}s")
+        except Exception as e:
+            logging.error(f"Cache warmer failed on {key}: {e}")
+    return refreshed
+
+
+class CacheWarmer(threading.Thread):
+    """Daemon thread that pre-populates the home page lists and keeps them refreshed ahead of expiry."""
+
+    def __init__(self, app, interval=WARM_INTERVAL, ahead=REFRESH_AHEAD):
+        super().__init__(name='cache-warmer', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.ahead = ahead
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            with self.app.app_context():
+                refreshed = warm_once(ahead=self.ahead)
+            if refreshed:
+                logging.info(f"Cache warmer refreshed {', '.join(refreshed)}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_warmer(app):
+    """Starts the process-wide warmer once; later calls are no-ops while it is running."""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None or not _warmer.is_alive():  # Threads don't survive a fork
+            _warmer = CacheWarmer(app)
+            _warmer.start()
+    return _warmer
@@ -0,0 +1,61 @@
+# writes.py
+
+from datetime import datetime
+from sqlalchemy import select
+from cf_engine import record_change
+from models import db, dialect_insert, Review, UserMovies
+from rating_stats import lock_movie_stats, refresh_movie_stats
+from recommendation import apply_genre_profile_change
+from utils import get_movie_details
+
+# Passed as review_text to leave an existing review's text as it is
+UNCHANGED = object()
+
+
+def save_rating(user_id, movie_id, rating, review_text=UNCHANGED):
+    """
+    Inserts or updates the user's review of a movie with one INSERT ... ON CONFLICT on (user_id, movie_id),
+    refreshing the movie's rating stats and applying the change to the user's genre profile in the same transaction.
+    Returns the previous rating (None for a first rating).
+    """
+    details = get_movie_details(movie_id)  # Before the transaction: this may call TMDB
+    genre_ids = details.get('genre_ids', []) if details else None
+
+    now = datetime.utcnow()
+    values = {'user_id': user_id, 'movie_id': movie_id, 'rating': rating, 'created_at': now}
+    updates = {'rating': rating, 'created_at': now}
+    if review_text is not UNCHANGED:
+        values['review_text'] = updates['review_text'] = review_text
+
+    try:
+        # Rating writes for this movie queue up here, so the previous rating (which drives the genre
+        # profile delta) can't change between reading it and the upsert, on SQLite or PostgreSQL
+        lock_movie_stats(db.session, movie_id)
+        old_rating = db.session.execute(
+            select(Review.rating).where(Review.user_id == user_id, Review.movie_id == movie_id)
+        ).scalar()
+        stmt = dialect_insert(Review).values(**values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[Review.user_id, Review.movie_id], set_=updates))
+        refresh_movie_stats(db.session, movie_id)
+        apply_genre_profile_change(user_id, genre_ids, old_rating, rating)
+        record_change(db.session, user_id, movie_id, rating)  # Core upserts don't fire the Review mapper events
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return old_rating
+
+
+def add_to_list(user_id, movie_id, category):
+    """Adds a movie to the user's watchlist or favorites in one statement; returns False if it was already there."""
+    stmt = dialect_insert(UserMovies).values(user_id=user_id, movie_id=movie_id, category=category)
+    try:
+        result = db.session.execute(stmt.on_conflict_do_nothing(
+            index_elements=[UserMovies.user_id, UserMovies.movie_id, UserMovies.category]
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount == 1